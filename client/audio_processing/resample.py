@@ -0,0 +1,26 @@
+import numpy as np
+from scipy.signal import firwin, lfilter
+
+
+class Decimator:
+    """
+    Streaming 2:1 decimator for 32kHz int16 PCM. A short windowed-sinc FIR low-pass
+    removes content above 8kHz before every second sample is kept, and its state is
+    carried across packets so chunk boundaries do not click.
+    """
+
+    def __init__(self, num_taps: int = 32, cutoff: float = 0.5):
+        """Design the anti-alias filter, cutoff is relative to the input Nyquist."""
+        self.taps = firwin(num_taps, cutoff).astype(np.float32)
+        self._zi = np.zeros(num_taps - 1, dtype=np.float32)
+
+    def reset(self) -> None:
+        """Clear the filter history, e.g. when a new stream starts."""
+        self._zi.fill(0)
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """Filter and decimate a chunk of int16 samples, returning contiguous int16."""
+        filtered, self._zi = lfilter(self.taps, 1.0, samples.astype(np.float32), zi=self._zi)
+        out = filtered[::2]
+        np.clip(out, -32768, 32767, out=out)
+        return np.rint(out).astype(np.int16)
@@ -1,5 +1,6 @@
 import numpy as np
 import os
+import re
 from typing import Dict, Set, Optional, Any
 import traceback
 from typing import Dict, List, Optional, Any
@@ -59,6 +60,7 @@ class WhisperProcessor:
                 }
         
         self.common_wake_words = ["alexa", "hey alexa", "ok google", "hey google", "siri", "hey siri", "mirfa"]
+        self._wake_pattern = re.compile(r'^(?:' + '|'.join(map(re.escape, self.common_wake_words)) + r')\s*', re.IGNORECASE)
 
     async def process_audio(self, audio_filename: str) -> Optional[str]:
         """Transcribe audio file using Whisper model with optimized GPU handling"""
@@ -206,14 +208,7 @@ class WhisperProcessor:
                 logger.warning(f"Failed to clear CUDA memory during VAD processing: {e}")                
     def _remove_wake_words(self, text: str) -> str:
         """Remove wake words while preserving case and spacing"""
-        text_lower = text.lower()
-        
-        for wake_word in self.common_wake_words:
-            if text_lower.startswith(wake_word):
-                # Preserve original case by using the original text
-                return text[len(wake_word):].strip()
-        
-        return text
+        return self._wake_pattern.sub('', text, count=1).strip()
 
 
 async def main():
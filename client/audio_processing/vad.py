@@ -1,85 +1,166 @@
 import numpy as np
-import torch
+import urllib.request
 import logging
 import os
+from typing import Literal, Union
 
 logger = logging.getLogger(__name__)
 
+SILERO_VAD_ONNX_URL = "https://github.com/snakers4/silero-vad/raw/master/src/silero_vad/data/silero_vad.onnx"
+
 class VADProcessor:
     """
-    Simplified Silero VAD implementation that works reliably on CPU
-    even with CUDA-enabled PyTorch installations.
+    Voice activity detection with a selectable backend: Silero VAD (v5) running
+    under ONNX Runtime with INT8 weights on CPU, or WebRTC VAD.
+    Only the dependency of the selected backend is imported.
     """
-    
-    def __init__(self) -> None:
-        """Initialize the Silero VAD model on CPU."""
+
+    def __init__(self, backend: Literal['silero', 'webrtc'] = 'silero') -> None:
+        """Initialize the selected VAD backend."""
+        self.backend = backend
+        self.sample_rate = 16000
+        self.silence_threshold = 15
+        self.chunk_size = 512
+        self.max_audio_length = 5.0  # Maximum audio length in seconds
+
+        if backend == 'silero':
+            self._init_silero()
+        elif backend == 'webrtc':
+            self._init_webrtc()
+        else:
+            raise ValueError(f"Unknown VAD backend: {backend}")
+
+    def _init_silero(self) -> None:
+        """Download, quantize and load the Silero VAD ONNX model on CPU."""
         try:
+            import onnxruntime as ort
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+
             # Setup cache dir
-            cache_dir = os.path.join(os.path.dirname(__file__), "models", "torch_cache")
+            cache_dir = os.path.join(os.path.dirname(__file__), "models", "onnx_cache")
             os.makedirs(cache_dir, exist_ok=True)
-            os.environ['TORCH_HOME'] = cache_dir
-            
-            logger.info(f"Loading Silero VAD model (CPU only)")
-            
-            # First load model without device specification
-            self.vad_model, utils = torch.hub.load(
-                repo_or_dir='snakers4/silero-vad',
-                model='silero_vad',
-                force_reload=False,
-                trust_repo=True
+            model_path = os.path.join(cache_dir, "silero_vad.onnx")
+            quantized_path = os.path.join(cache_dir, "silero_vad.int8.onnx")
+
+            if not os.path.exists(model_path):
+                logger.info(f"Downloading Silero VAD ONNX model to {model_path}")
+                urllib.request.urlretrieve(SILERO_VAD_ONNX_URL, model_path)
+
+            # Quantize once, later starts reuse the cached INT8 model
+            if not os.path.exists(quantized_path):
+                try:
+                    logger.info("Quantizing Silero VAD model to INT8")
+                    quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+                except Exception as e:
+                    logger.warning(f"INT8 quantization failed, using FP32 model: {e}")
+                    quantized_path = model_path
+
+            logger.info(f"Loading Silero VAD model (CPU only) from {quantized_path}")
+
+            so = ort.SessionOptions()
+            # Single-threaded is fastest for batch=1 streaming VAD
+            so.intra_op_num_threads = 1
+            so.inter_op_num_threads = 1
+            self.session = ort.InferenceSession(
+                quantized_path,
+                providers=['CPUExecutionProvider'],
+                sess_options=so
             )
-            
-            # Then explicitly move it to CPU
-            self.vad_model = self.vad_model.to('cpu')
-            self.vad_model.eval()
-            
-            logger.info(f"Model loaded on: {next(self.vad_model.parameters()).device}")
-            
+
             # Configuration
-            self.sample_rate = 16000
             self.threshold = 0.4
-            self.min_audio_length =1 
-            self.silence_threshold = 15
-            self.chunk_size = 512
+            self.min_audio_length =1
             self.vad_threshold = 0.4
+            self.batch_size = min(2 * (os.cpu_count() or 1), 24)
+
+            # Streaming state carried between chunks
+            self._sr = np.array(self.sample_rate, dtype=np.int64)
+            self._context_size = 64  # samples of left context expected by v5 at 16kHz
+            self.reset_states()
         except Exception as e:
             logger.error(f"Failed to initialize Silero VAD: {e}")
             raise
-    
-    def process_chunk(self, audio_chunk: np.ndarray, binary_output: bool = True) -> float:
+
+    def _init_webrtc(self) -> None:
+        """Create a WebRTC VAD instance."""
+        import webrtcvad
+
+        # WebRTC VAD has aggression levels 0-3, with 3 being the most aggressive
+        self.vad = webrtcvad.Vad(1)
+        # WebRTC VAD only supports 8000, 16000, 32000, 48000 Hz
+        self.vad_threshold = 0.5
+        self.min_audio_length = 1.0  # Minimum audio length in seconds
+        # WebRTC VAD expects frames of 10, 20, or 30ms; use 30ms of int16 (960 bytes at 16kHz)
+        self._frame_bytes = int(self.sample_rate * 30 / 1000) * 2
+
+    def reset_states(self) -> None:
+        """Reset the recurrent state between independent audio streams."""
+        self.state = np.zeros((2, 1, 128), dtype=np.float32)
+        self._context = np.zeros((1, self._context_size), dtype=np.float32)
+
+    def process_chunk(self, audio_chunk: Union[bytes, np.ndarray], binary_output: bool = True) -> float:
         """
         Process audio chunk and return speech probability or binary decision.
-        
+
         Args:
-            audio_chunk: Audio data as numpy array
+            audio_chunk: Audio data as numpy array (or raw int16 bytes for webrtc)
             binary_output: If True, returns 0.0 or 1.0 based on threshold (0.4)
-            
+
         Returns:
             float: Speech probability or binary decision
         """
+        if self.backend == 'webrtc':
+            return self._process_chunk_webrtc(audio_chunk)
         try:
             # Ensure audio is the right shape
-            if len(audio_chunk.shape) == 1:
-                audio_chunk = audio_chunk.reshape(1, -1)
-            
-            # Convert to tensor on CPU
-            audio_tensor = torch.tensor(audio_chunk, dtype=torch.float32)
-            audio_tensor = audio_tensor.to('cpu')  # Ensure it's on CPU
-            
-            # Get speech probability
-            with torch.no_grad():
-                speech_prob = self.vad_model(audio_tensor, self.sample_rate).item()
-            
+            audio_chunk = np.asarray(audio_chunk, dtype=np.float32).reshape(1, -1)
+            audio_input = np.concatenate((self._context, audio_chunk), axis=1)
+
+            # Get speech probability and carry the state into the next chunk
+            out, self.state = self.session.run(
+                None,
+                {"input": audio_input, "state": self.state, "sr": self._sr}
+            )
+            self._context = audio_input[:, -self._context_size:]
+            speech_prob = float(out[0][0])
+
             # Convert to binary if requested
             # if binary_output:
             #     return 1.0 if speech_prob > 0.4 else 0.0
-            
+
             return speech_prob
-            
+
         except Exception as e:
             logger.error(f"Error in VAD processing: {e}")
             return 0.0
-        
+
+    def _process_chunk_webrtc(self, audio_chunk: Union[bytes, np.ndarray]) -> float:
+        """Run WebRTC VAD on every complete 30ms frame and return the speech ratio."""
+        try:
+            # Raw int16 PCM is used as-is; only float32 input needs converting
+            if isinstance(audio_chunk, (bytes, bytearray, memoryview)):
+                audio_bytes = bytes(audio_chunk)
+            elif audio_chunk.dtype == np.int16:
+                audio_bytes = audio_chunk.tobytes()
+            else:
+                audio_bytes = (audio_chunk * 32768).astype(np.int16).tobytes()
+
+            frame_bytes = self._frame_bytes
+            num_frames = len(audio_bytes) // frame_bytes
+            if not num_frames:
+                logger.warning(f"Audio chunk too small for WebRTC VAD: {len(audio_bytes)} bytes")
+                return 0.0
+
+            # Fraction of frames flagged as speech (0.0 - 1.0)
+            speech_frames = 0
+            for offset in range(0, num_frames * frame_bytes, frame_bytes):
+                speech_frames += self.vad.is_speech(audio_bytes[offset:offset + frame_bytes], self.sample_rate)
+            return speech_frames / num_frames
+
+        except Exception as e:
+            logger.error(f"Error in VAD processing: {e}")
+            return 0.0
+
     def get_audio_duration(self, audio_length: int, sample_rate: int = 16000,
                           sample_width: int = 2, channels: int = 1) -> float:
         """Calculate audio duration in seconds."""
@@ -2,7 +2,7 @@ from aioesphomeapi import APIClient
 from aioesphomeapi.model import VoiceAssistantAudioSettings
 from utils.logger import setup_logger
 from config import ESPHomeConfig
-from typing import Callable, Optional, Coroutine, Any
+from typing import Callable, Optional, Coroutine, Any, Union
 import asyncio
 import logging
 import time
@@ -23,11 +23,30 @@ class ESPHomeClientWrapper:
             config.encryption_key, 
             noise_psk=config.encryption_key
         )
+        # Connection state is kept in an event so the supervisor can await a drop
+        self.disconnected = asyncio.Event()
         self.is_connected = False
         self._lock = asyncio.Lock()
         self._connect_time = None
         logger.info(f"ESPHomeClientWrapper initialized for {config.host}:{config.port}")
 
+    @property
+    def is_connected(self) -> bool:
+        return not self.disconnected.is_set()
+
+    @is_connected.setter
+    def is_connected(self, value: bool) -> None:
+        if value:
+            self.disconnected.clear()
+        else:
+            self.disconnected.set()
+
+    async def _on_stop(self, expected_disconnect: bool) -> None:
+        """Mark the connection as lost when aioesphomeapi reports it closed"""
+        logger.info(f"ESPHome connection closed (expected: {expected_disconnect})")
+        self.is_connected = False
+        self._connect_time = None
+
     async def connect(self) -> None:
         """Connect to ESPHome device if not already connected"""
         async with self._lock:
@@ -38,7 +57,7 @@ class ESPHomeClientWrapper:
             logger.info(f"Attempting to connect to ESPHome device at {self.config.host}:{self.config.port}")
             try:
                 connect_start = time.time()
-                await self.client.connect(login=True)
+                await self.client.connect(on_stop=self._on_stop, login=True)
                 connect_duration = time.time() - connect_start
                 logger.info(f"Connected to ESPHome device in {connect_duration:.2f} seconds")
                 
@@ -100,7 +119,7 @@ class ESPHomeClientWrapper:
 
     def subscribe_voice_assistant(
         self,
-        handle_audio: Callable[[bytes], Coroutine[Any, Any, None]],
+        handle_audio: Callable[[bytes], Union[None, Coroutine[Any, Any, None]]],
         handle_start: Optional[Callable[[], Coroutine[Any, Any, None]]] = None,
         handle_stop: Optional[Callable[[], Coroutine[Any, Any, None]]] = None
     ) -> None:
@@ -108,7 +127,7 @@ class ESPHomeClientWrapper:
         Subscribe to voice assistant events
         
         Args:
-            handle_audio: Coroutine to handle received audio data
+            handle_audio: Callback or coroutine to handle received audio data
             handle_start: Optional coroutine to handle start events
             handle_stop: Optional coroutine to handle stop events
             
@@ -133,8 +152,12 @@ class ESPHomeClientWrapper:
                     await handle_stop()
                     
             async def logged_handle_audio(audio_data: bytes):
-                logger.debug(f"Received audio data: {len(audio_data)} bytes")
-                await handle_audio(audio_data)
+                # Per-chunk log, let logging format it only when DEBUG is on
+                logger.debug("Received audio data: %d bytes", len(audio_data))
+                # Plain callbacks are called directly, no extra coroutine per chunk
+                result = handle_audio(audio_data)
+                if result is not None:
+                    await result
             
             self.client.subscribe_voice_assistant(
                 handle_start=logged_handle_start,
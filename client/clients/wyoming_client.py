@@ -3,10 +3,11 @@ from wyoming.info import Info, Satellite
 from wyoming.audio import AudioChunk, AudioStart, AudioStop
 from wyoming.wake import Detection
 from utils.logger import setup_logger
+from utils.network import tune_tcp_client
 from config import WyomingConfig
 import asyncio
 import time
-from typing import Optional
+from typing import Optional, Union
 
 logger = setup_logger(__name__)
 
@@ -14,15 +15,37 @@ class WyomingClientWrapper:
     def __init__(self, config: WyomingConfig):
         self.config = config
         self.client: Optional[AsyncTcpClient] = None
+        # Connection state is kept in events so readers can await changes instead of polling
+        self._connected = asyncio.Event()
+        self.disconnected = asyncio.Event()
         self.is_connected = False
         self.is_streaming = False
         self.stream_queue = asyncio.Queue(maxsize=50)
 
+    @property
+    def is_connected(self) -> bool:
+        return self._connected.is_set()
+
+    @is_connected.setter
+    def is_connected(self, value: bool) -> None:
+        if value:
+            self.disconnected.clear()
+            self._connected.set()
+        else:
+            self._connected.clear()
+            self.disconnected.set()
+
+    async def wait_connected(self) -> None:
+        """Wait until the client is connected to the Wyoming server"""
+        await self._connected.wait()
+
     async def connect(self) -> None:
         """Connect to Wyoming server"""
         try:
             self.client = AsyncTcpClient(self.config.host, self.config.port)
             await self.client.connect()
+            # Send small audio events immediately and keep the connection alive
+            tune_tcp_client(self.client, logger, sndbuf=262144, keepalive=True)
             await self.register_device()
             self.is_connected = True
             logger.info(f"Connected to Wyoming server at {self.config.host}:{self.config.port}")
@@ -120,7 +143,7 @@ class WyomingClientWrapper:
         self.is_streaming = False
         logger.info("Stopped audio stream")
 
-    async def send_audio_chunk(self, audio_data: bytes, sample_rate: int, width: int, channels: int) -> None:
+    async def send_audio_chunk(self, audio_data: Union[bytes, bytearray], sample_rate: int, width: int, channels: int) -> None:
         """Send audio chunk to server"""
         if not self.client or not self.is_streaming:
             return
@@ -144,7 +167,12 @@ class WyomingClientWrapper:
             return None
             
         try:
-            return await self.client.read_event()
+            event = await self.client.read_event()
+            if event is None:
+                # Server closed the connection
+                logger.info("Wyoming server closed the connection")
+                self.is_connected = False
+            return event
         except Exception as e:
             logger.error(f"Error reading Wyoming event: {e}")
             self.is_connected = False
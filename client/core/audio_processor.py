@@ -1,11 +1,12 @@
 import numpy as np
-from collections import deque
 from wake_word.detector import WakeWordDetector
 from utils.logger import setup_logger
 from config import AudioConfig, WakeWordConfig
 from typing import Optional, Callable, Coroutine, Any
 import struct
 import asyncio
+import concurrent.futures
+import logging
 
 logger = setup_logger(__name__)
 
@@ -14,20 +15,40 @@ class AudioProcessor:
         self,
         audio_config: AudioConfig,
         wake_word_config: WakeWordConfig,
-        on_wake_word: Optional[Callable[[float], Coroutine[Any, Any, None]]] = None
+        on_wake_word: Optional[Callable[[float], Coroutine[Any, Any, None]]] = None,
+        detector: Optional[WakeWordDetector] = None,
+        mic_id: str = "default"
     ):
         self.audio_config = audio_config
         self.wake_word_config = wake_word_config
         self.on_wake_word = on_wake_word
+        self.mic_id = mic_id
         
-        # Initialize audio buffer (500ms buffer at 16kHz)
-        self.audio_buffer = deque(maxlen=50)
+        # Two fixed-capacity int16 buffers of buffer_size chunks, written in place and
+        # swapped when one is handed to the detector. Sized from the first chunk since
+        # ESPHome chunk sizes vary (160/512 samples).
+        self.buffer_chunks = audio_config.buffer_size
+        self.chunk_samples = 0
+        self._ring = np.empty(0, dtype=np.int16)
+        self._spare = np.empty(0, dtype=np.int16)
+        self._spare_busy = False  # The detector still reads the last handed-off buffer
+        self._write_idx = 0
+        self._buffered_chunks = 0
         
-        # Initialize wake word detector
-        self.detector = WakeWordDetector(
-            wake_word_model=wake_word_config.wake_word,
-            model_path=wake_word_config.model_path
-        )
+        # Reuse a shared wake word detector when given, it keeps per-mic state
+        if detector is None:
+            detector = WakeWordDetector(
+                wake_word_models=[wake_word_config.wake_word],
+                model_paths=[wake_word_config.model_path] if wake_word_config.model_path else []
+            )
+        self.detector = detector
+        
+        # Detection runs on its own thread, fed by a one-slot queue so that
+        # audio ingestion never waits on wake word inference
+        self._detect_queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self._detect_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._detect_task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
         
         # State management
         self.is_streaming = False
@@ -37,6 +58,10 @@ class AudioProcessor:
 
     async def process_audio(self, data: bytes) -> np.ndarray:
         """Process incoming audio data"""
+        return self.process_audio_sync(data)
+
+    def process_audio_sync(self, data: bytes) -> np.ndarray:
+        """Process incoming audio data without awaiting, safe to call from a worker thread"""
         try:
             # Convert incoming data to numpy array regardless of streaming state
             audio_data = np.frombuffer(data, dtype=np.int16)
@@ -47,33 +72,43 @@ class AudioProcessor:
             # Get the number of samples in this chunk
             num_samples = len(data) // 2  # 2 bytes per sample for int16
             
-            # Log stats periodically
-            if self.audio_chunks % 100 == 0:
+            # Log stats periodically, skipping the array scan unless debugging
+            if self.audio_chunks % 100 == 0 and logger.isEnabledFor(logging.DEBUG):
                 logger.debug(f"Chunk size: {len(data)} bytes, {num_samples} samples")
                 if len(audio_data) > 0:
-                    logger.debug(f"Sample values - Min: {np.min(audio_data)}, Max: {np.max(audio_data)}")
+                    logger.debug(f"Sample peak-to-peak: {np.ptp(audio_data)}")
             
-            # Process audio in float32
-            audio_float = audio_data.astype(np.float32) / 32767.0
-            audio_float = np.clip(audio_float, -1.0, 1.0)
+            # Allocate on the first chunk, grow once if later chunks are larger
+            if not self.chunk_samples:
+                self.chunk_samples = num_samples
+                self._ring = np.empty(self.buffer_chunks * num_samples, dtype=np.int16)
+                self._spare = np.empty_like(self._ring)
+            end = self._write_idx + num_samples
+            if end > self._ring.size:
+                ring = np.empty(max(end, self.buffer_chunks * num_samples), dtype=np.int16)
+                ring[:self._write_idx] = self._ring[:self._write_idx]
+                self._ring = ring
             
-            # Add to buffer
-            self.audio_buffer.append(audio_float)
+            # Keep the raw int16 samples, the detector consumes them as-is
+            self._ring[self._write_idx:end] = audio_data
+            self._write_idx = end
+            self._buffered_chunks += 1
             
             # Process buffer if we have enough data
-            if len(self.audio_buffer) >= self.audio_buffer.maxlen:
-                # Process buffer as a single numpy array
-                buffer_data = np.concatenate(list(self.audio_buffer))
-                self.audio_buffer.clear()
-                
-                # Convert to int16 for wake word detection
-                audio_int16 = (buffer_data * 32767).astype(np.int16)
-                
-                # Check for wake word
-                if self.detector.detect(audio_int16):
-                    logger.info("Wake word detected!")
-                    if self.on_wake_word:
-                        await self.on_wake_word(0.75)
+            if self._buffered_chunks >= self.buffer_chunks:
+                # Hand the filled region to the detector and continue in the spare
+                # buffer, no copy. If the detector still holds the spare it is behind,
+                # so this window is skipped and the current buffer is reused
+                audio_int16 = self._ring[:self._write_idx]
+                if self._loop is not None and not self._spare_busy:
+                    self._spare_busy = True
+                    self._ring, self._spare = self._spare, self._ring
+                    # Queue for wake word detection on the event loop thread
+                    self._loop.call_soon_threadsafe(self._queue_detection, audio_int16)
+                else:
+                    logger.debug("Wake word detector busy, dropping audio window")
+                self._write_idx = 0
+                self._buffered_chunks = 0
                 
                 self.audio_chunks += 1
                 return audio_int16
@@ -85,15 +120,53 @@ class AudioProcessor:
             logger.error(f"Error processing audio: {e}", exc_info=True)
             return np.array([], dtype=np.int16)
 
+    def _queue_detection(self, audio_int16: np.ndarray):
+        """Queue a window for wake word detection, dropping it if the detector is behind"""
+        try:
+            self._detect_queue.put_nowait(audio_int16)
+        except asyncio.QueueFull:
+            logger.debug("Wake word detector busy, dropping audio window")
+            self._release_spare()
+
+    def _release_spare(self, _future=None):
+        """Let the next full window swap buffers again, the detector is done with the spare"""
+        self._spare_busy = False
+
+    async def _detection_worker(self):
+        """Consume queued audio windows and run wake word detection off the event loop"""
+        while True:
+            audio_int16 = await self._detect_queue.get()
+            # The buffer is released when the thread is done with it, even if this task is cancelled
+            future = self._detect_executor.submit(self.detector.detect, audio_int16, self.mic_id)
+            future.add_done_callback(self._release_spare)
+            try:
+                if await asyncio.wrap_future(future):
+                    logger.info("Wake word detected!")
+                    if self.on_wake_word:
+                        await self.on_wake_word(0.75)
+            except Exception as e:
+                logger.error(f"Error in wake word detection: {e}", exc_info=True)
+
     async def start_streaming(self):
         """Start audio streaming"""
         self.is_streaming = True
-        self.audio_buffer.clear()
+        self._write_idx = 0
+        self._buffered_chunks = 0
         self.audio_chunks = 0
+        self._loop = asyncio.get_running_loop()
+        if self._detect_task is None or self._detect_task.done():
+            self._detect_task = asyncio.create_task(self._detection_worker())
         logger.info("Started audio streaming")
 
     async def stop_streaming(self):
         """Stop audio streaming"""
         self.is_streaming = False
-        self.audio_buffer.clear()
+        self._write_idx = 0
+        self._buffered_chunks = 0
+        if self._detect_task:
+            self._detect_task.cancel()
+            self._detect_task = None
+        while not self._detect_queue.empty():
+            self._detect_queue.get_nowait()
+            self._release_spare()
         logger.info("Stopped audio streaming")
\ No newline at end of file
@@ -1,20 +1,31 @@
 import asyncio
+import concurrent.futures
 from typing import Optional
-import uuid
+import secrets
 from  utils.logger import setup_logger
 from config import AppConfig
 from clients.esphome_client import ESPHomeClientWrapper
 from clients.wyoming_client import WyomingClientWrapper
 from .audio_processor import AudioProcessor
+from wake_word.detector import WakeWordDetector
 from aioesphomeapi.model import VoiceAssistantAudioSettings
 import time
 logger = setup_logger(__name__)
 
+_TX_FLUSH = object()  # Queued by the flush deadline so sends stay on the audio worker
+
 class VoiceAssistant:
-    def __init__(self, config: AppConfig):
+    def __init__(self, config: AppConfig, detector: Optional[WakeWordDetector] = None):
         self.config = config
         self.conversation_id: Optional[str] = None
+        
+        # Audio format read once, used for every outgoing chunk
+        self._sr = int(config.audio.sample_rate)
+        self._sw = int(config.audio.sample_width)
+        self._ch = int(config.audio.channels)
+        self._stop_evt = asyncio.Event()
         self.is_running = False
+        self.reconnect_delay = 1.0  # seconds between failed reconnect attempts
         
         # Initialize clients
         self.esphome_client = ESPHomeClientWrapper(config.esphome)
@@ -24,8 +35,32 @@ class VoiceAssistant:
         self.audio_processor = AudioProcessor(
             audio_config=config.audio,
             wake_word_config=config.wake_word,
-            on_wake_word=self.handle_wake_word
+            on_wake_word=self.handle_wake_word,
+            detector=detector,
+            mic_id=config.esphome.host
         )
+        
+        # Incoming audio is queued and processed on a single worker thread
+        # so the ESPHome callback returns immediately
+        self._audio_q: asyncio.Queue = asyncio.Queue(maxsize=32)
+        self._audio_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        
+        # Outgoing audio is coalesced into ~80ms Wyoming chunks (4 x 20ms)
+        self._tx_buf = bytearray()
+        self._tx_batch_bytes = 4 * (self._sr // 50) * self._sw * self._ch
+        self._tx_max_delay = 0.06  # seconds before a partial batch is flushed
+        self._tx_timer: Optional[asyncio.TimerHandle] = None  # Armed only while _tx_buf has data
+
+    @property
+    def is_running(self) -> bool:
+        return not self._stop_evt.is_set()
+
+    @is_running.setter
+    def is_running(self, value: bool) -> None:
+        if value:
+            self._stop_evt.clear()
+        else:
+            self._stop_evt.set()
 
     async def handle_pipeline_start(
         self,
@@ -38,7 +73,8 @@ class VoiceAssistant:
         logger.info("=== Pipeline Start ===")
         logger.info(f"Conversation ID: {conversation_id}")
         
-        self.conversation_id = conversation_id or str(uuid.uuid4())
+        # ESPHome normally supplies an ID, only generate one when it does not
+        self.conversation_id = conversation_id or secrets.token_hex(16)
         self.is_running = True
         
         return 0  # No port needed since we're not using UDP
@@ -51,83 +87,73 @@ class VoiceAssistant:
     async def handle_pipeline_finished(self):
         """Handle the completion of a voice assistant pipeline"""
         logger.info("Voice assistant pipeline finished")
+        await self._flush_tx()
         await self.wyoming_client.stop_stream()
         self.conversation_id = None
         self.is_running = False
 
-    async def handle_audio(self, audio_data: bytes) -> None:
+    def handle_audio(self, audio_data: bytes) -> None:
         """Handle incoming audio data from ESPHome device"""
-        
         try:
-            # Initialize counters if needed
-            # if not hasattr(self, '_audio_stats'):
-            #     self._audio_stats = {
-            #         'chunks_received': 0,
-            #         'bytes_received': 0,
-            #         'last_log_time': 0,
-            #         'streaming_chunks': 0
-            #     }
-            
-            # # Update stats
-            # self._audio_stats['chunks_received'] += 1
-            # self._audio_stats['bytes_received'] += len(audio_data)
-            
-            # # Log stats every second
-            # current_time = time.time()
-            # if current_time - self._audio_stats['last_log_time'] >= 1.0:
-            #     logger.debug(
-            #         f"Audio stats - Chunks: {self._audio_stats['chunks_received']}, "
-            #         f"Bytes: {self._audio_stats['bytes_received']}, "
-            #         f"Avg chunk size: {self._audio_stats['bytes_received'] / max(1, self._audio_stats['chunks_received']):.1f} bytes"
-            #     )
-            #     # Reset counters
-            #     self._audio_stats['chunks_received'] = 0
-            #     self._audio_stats['bytes_received'] = 0
-            #     self._audio_stats['last_log_time'] = current_time
-            
-            # # Validate audio data
-            # if not audio_data or len(audio_data) == 0:
-            #     logger.warning("Received empty audio data")
-            #     return
-            
-            # # Check if chunk size is as expected (2 bytes per sample)
-            # expected_chunk_size = 2 * (self.config.audio.sample_rate // 50)  # 20ms chunks
-            # if len(audio_data) != expected_chunk_size:
-            #     logger.warning(f"Unexpected chunk size: {len(audio_data)} bytes (expected {expected_chunk_size})")
+            self._audio_q.put_nowait(audio_data)
+        except asyncio.QueueFull:
+            # Drop the oldest chunk when the worker falls behind to bound latency
+            self._audio_q.get_nowait()
+            self._audio_q.put_nowait(audio_data)
+
+    async def _audio_worker(self) -> None:
+        """Process queued audio off the event loop and forward it to Wyoming"""
+        loop = asyncio.get_running_loop()
+        while True:
+            # Block without a timeout, the flush deadline wakes the worker only when needed
+            audio_data = await self._audio_q.get()
+            if audio_data is _TX_FLUSH:
+                # Flush a partial batch so the tail of an utterance is not held back
+                await self._flush_tx()
+                continue
+            try:
+                # Process audio
+                processed_audio = await loop.run_in_executor(
+                    self._audio_executor, self.audio_processor.process_audio_sync, audio_data
+                )
             
-            # Process audio
-            processed_audio = await self.audio_processor.process_audio(audio_data)
+                # Handle processed audio
+                if processed_audio.size > 0:
+                    # Send to Wyoming server if streaming
+                    if self.wyoming_client.is_streaming and self.wyoming_client.is_connected:
+                        # Coalesce chunks and send once the batch is full or has waited long enough
+                        self._tx_buf += memoryview(processed_audio).cast('B')
+                        if len(self._tx_buf) >= self._tx_batch_bytes:
+                            await self._flush_tx()
+                        elif self._tx_timer is None:
+                            self._tx_timer = loop.call_later(self._tx_max_delay, self._on_tx_deadline)
             
-            # Handle processed audio
-            if processed_audio.size > 0:
-                # Get audio processor stats
-                # audio_stats = self.audio_processor.get_stats()
-                
-                # # Log detailed stats periodically
-                # if audio_stats['chunks_processed'] % 100 == 0:
-                #     logger.debug(
-                #         f"Audio processing stats - Buffer: {audio_stats['buffer_size']}, "
-                #         f"Max amplitude: {audio_stats['last_max_amplitude']}, "
-                #         f"Silence counter: {audio_stats['silence_counter']}"
-                #     )
-                logger.info("here in process audio")
-                
-                # Send to Wyoming server if streaming
-                if self.wyoming_client.is_streaming and self.wyoming_client.is_connected:
-                    # self._audio_stats['streaming_chunks'] += 1
-                    await self.wyoming_client.send_audio_chunk(
-                        processed_audio.tobytes(),
-                        self.config.audio.sample_rate,
-                        self.config.audio.sample_width,
-                        self.config.audio.channels
-                    )
-                    
-                    # Log streaming stats
-                    # if self._audio_stats['streaming_chunks'] % 100 == 0:
-                    #     logger.debug(f"Streaming stats - Chunks sent: {self._audio_stats['streaming_chunks']}")
-        
-        except Exception as e:
-            logger.error(f"Error handling audio data: {e}", exc_info=True)
+            except Exception as e:
+                logger.error(f"Error handling audio data: {e}", exc_info=True)
+
+    def _on_tx_deadline(self) -> None:
+        """Ask the audio worker to flush the partial batch that has waited long enough"""
+        self._tx_timer = None
+        try:
+            self._audio_q.put_nowait(_TX_FLUSH)
+        except asyncio.QueueFull:
+            # The worker is behind, it re-arms the deadline after its next chunk
+            pass
+
+    async def _flush_tx(self) -> None:
+        """Send the coalesced audio to Wyoming as a single chunk"""
+        if self._tx_timer is not None:
+            self._tx_timer.cancel()
+            self._tx_timer = None
+        if not self._tx_buf:
+            return
+        audio, self._tx_buf = self._tx_buf, bytearray()
+        await self.wyoming_client.send_audio_chunk(
+            audio,
+            self._sr,
+            self._sw,
+            self._ch
+        )
 
     async def handle_wake_word(self, score: float):
         """Handle wake word detection"""
@@ -146,9 +172,9 @@ class VoiceAssistant:
             
             # Start streaming
             await self.wyoming_client.start_stream(
-                self.config.audio.sample_rate,
-                self.config.audio.sample_width,
-                self.config.audio.channels
+                self._sr,
+                self._sw,
+                self._ch
             )
             
         except Exception as e:
@@ -159,11 +185,15 @@ class VoiceAssistant:
     async def process_wyoming_events(self):
         """Process events from Wyoming server"""
         while self.is_running:
-            if self.wyoming_client.is_connected:
-                event = await self.wyoming_client.read_event()
-                if event and event.type == 'audio-stop':
-                    await self.wyoming_client.stop_stream()
-            await asyncio.sleep(0.1)
+            if not self.wyoming_client.is_connected:
+                # Sleep until the client reconnects instead of polling
+                await self.wyoming_client.wait_connected()
+                continue
+            
+            # Blocks on the socket until the server sends something
+            event = await self.wyoming_client.read_event()
+            if event and event.type == 'audio-stop':
+                await self.wyoming_client.stop_stream()
 
     async def connect(self):
         """Connect to both ESPHome and Wyoming servers"""
@@ -223,41 +253,62 @@ class VoiceAssistant:
     async def run(self):
         """Main run loop"""
         try:
-            # Connect to services
-            await self.connect()
-            
-            # Start audio processing
-            await self.audio_processor.start_streaming()
-            
-            # Start Wyoming event processing
-            wyoming_task = asyncio.create_task(self.process_wyoming_events())
-            
-            # Keep running until stopped
-            while self.is_running:
-                await asyncio.sleep(1)
+            # Every background task lives in the group and is cancelled with it
+            async with asyncio.TaskGroup() as tg:
+                # Connect to services
+                await self.connect()
                 
-                # Check Wyoming connection and reconnect if needed
-                if not self.wyoming_client.is_connected:
-                    logger.info("Wyoming connection lost, attempting to reconnect...")
-                    try:
-                        await self.wyoming_client.connect()
-                    except Exception as e:
-                        logger.error(f"Wyoming reconnection failed: {e}")
+                # Start audio processing
+                await self.audio_processor.start_streaming()
                 
-                # Check ESPHome connection and reconnect if needed
-                if not self.esphome_client.is_connected:
-                    logger.info("ESPHome connection lost, attempting to reconnect...")
+                # Start audio and Wyoming event processing
+                workers = (
+                    tg.create_task(self._audio_worker(), name='audio_worker'),
+                    tg.create_task(self.process_wyoming_events(), name='wyoming_events'),
+                )
+                
+                # Keep running until stopped, waking only when a connection drops
+                while self.is_running:
+                    waiters = {
+                        asyncio.create_task(event.wait())
+                        for event in (self.esphome_client.disconnected, self.wyoming_client.disconnected, self._stop_evt)
+                    }
                     try:
-                        await self.connect()
-                    except Exception as e:
-                        logger.error(f"ESPHome reconnection failed: {e}")
-            
-            # Cancel Wyoming event processing
-            wyoming_task.cancel()
-            try:
-                await wyoming_task
-            except asyncio.CancelledError:
-                pass
+                        await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+                    finally:
+                        # Also runs when run() is cancelled, so no waiter is leaked
+                        for waiter in waiters:
+                            waiter.cancel()
+                    if not self.is_running:
+                        break
+                
+                    reconnected = True
+                
+                    # Check Wyoming connection and reconnect if needed
+                    if not self.wyoming_client.is_connected:
+                        logger.info("Wyoming connection lost, attempting to reconnect...")
+                        try:
+                            await self.wyoming_client.connect()
+                        except Exception as e:
+                            logger.error(f"Wyoming reconnection failed: {e}")
+                            reconnected = False
+                
+                    # Check ESPHome connection and reconnect if needed
+                    if not self.esphome_client.is_connected:
+                        logger.info("ESPHome connection lost, attempting to reconnect...")
+                        try:
+                            await self.connect()
+                        except Exception as e:
+                            logger.error(f"ESPHome reconnection failed: {e}")
+                            reconnected = False
+                
+                    # Back off before retrying a failed reconnect
+                    if not reconnected:
+                        await asyncio.sleep(self.reconnect_delay)
+                
+                # Stopped, let the group wind down its workers
+                for task in workers:
+                    task.cancel()
                 
         except asyncio.CancelledError:
             logger.info("Shutting down...")
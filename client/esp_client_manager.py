@@ -3,7 +3,6 @@ import logging
 from aioesphomeapi import APIClient
 import socket
 import time
-import backoff  # Add this dependency
 from aioesphomeapi.model import (
     VoiceAssistantAudioData, 
     VoiceAssistantAudioSettings, 
@@ -17,6 +16,16 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+async def _retry(coro_fn, tries: int = 5, base: float = 1.0, cap: float = 30.0):
+    """Await coro_fn(), retrying failures with capped exponential delay"""
+    for attempt in range(tries):
+        try:
+            return await coro_fn()
+        except Exception:
+            if attempt == tries - 1:
+                raise
+            await asyncio.sleep(min(cap, base * 2 ** attempt))
+
 # class VoiceAssistantUDPServer:
 #     def __init__(self, host: str = '0.0.0.0', port: int = 12345, max_retries: int = 3):
 #         self.host = host
@@ -156,9 +165,6 @@ class VoiceAssistantClient:
         self.port = port
         self.encryption_key = encryption_key
         self.client = APIClient(host, port, password="", noise_psk=encryption_key)
-        self.reconnect_attempts = 0
-        self.max_reconnect_attempts = 5
-        self.reconnect_delay = 1
         self._request_timeout = 30
         self.udp_port = udp_port
         self._running = True
@@ -176,27 +182,22 @@ class VoiceAssistantClient:
         return self.udp_port  # Return the shared UDP port
 
     async def handle_stop(self, server_side: bool) -> None:
-        logger.info(f"🛑 Voice assistant stopped streaming from {self.host} (server_side: {server_side})")
+        logger.info("🛑 Voice assistant stopped streaming from %s (server_side: %s)", self.host, server_side)
         pass
 
     async def handle_pipeline_finished(self):
-        logger.info(f"🛑 Voice assistant finished for {self.host}")
+        logger.info("🛑 Voice assistant finished for %s", self.host)
         pass
 
-    @backoff.on_exception(
-        backoff.expo,
-        Exception,
-        max_tries=5,
-        max_time=60
-    )
     async def connect(self):
+        """Connect and subscribe, retrying with exponential backoff"""
+        await _retry(self._connect_once)
+
+    async def _connect_once(self):
         try:
             await self.client.connect(login=True)
             logger.info(f"🔌 Connected to {self.host}:{self.port}")
             
-            self.reconnect_attempts = 0
-            self.reconnect_delay = 1
-            
             device_info = await self.client.device_info()
             logger.info(f"📱 Device: {device_info.name} (ESPHome {device_info.esphome_version})")
             
@@ -204,14 +205,7 @@ class VoiceAssistantClient:
             
         except Exception as e:
             logger.error(f"❌ Connection failed for {self.host}: {e}")
-            if self.reconnect_attempts < self.max_reconnect_attempts:
-                self.reconnect_attempts += 1
-                self.reconnect_delay *= 2
-                logger.info(f"Retrying connection to {self.host} in {self.reconnect_delay} seconds...")
-                await asyncio.sleep(self.reconnect_delay)
-                await self.connect()
-            else:
-                raise RuntimeError(f"Max reconnection attempts reached for {self.host}")
+            raise
 
     async def subscribe_to_events(self):
         try:
@@ -260,28 +254,31 @@ async def main():
         }
     ]
 
+    # Create all clients once so their APIClient state is reused across restarts
+    clients = [
+        VoiceAssistantClient(
+            host=device["host"],
+            encryption_key=device["encryption_key"],
+            port=device["port"],
+            udp_port=12345
+        )
+        for device in ESP_DEVICES
+    ]
+
     while True:
         try:
             # Start UDP server first
             # voice_assistant_udp_server = VoiceAssistantUDPServer()
             # udp_port = await voice_assistant_udp_server.start_server()
 
-            # Create all clients
-            clients = [
-                VoiceAssistantClient(
-                    host=device["host"],
-                    encryption_key=device["encryption_key"],
-                    port=device["port"],
-                    udp_port=12345
-                )
-                for device in ESP_DEVICES
-            ]
+            for client in clients:
+                client._running = True
 
-            # Run all clients concurrently using gather
+            # Run all clients in a task group, a failing client cancels the others
             try:
-                await asyncio.gather(*(client.run() for client in clients))
-            except Exception as e:
-                logger.error(f"Error in client execution: {e}")
+                async with asyncio.TaskGroup() as tg:
+                    for client in clients:
+                        tg.create_task(client.run())
             finally:
                 # Cleanup clients
                 for client in clients:
@@ -295,4 +292,10 @@ async def main():
             await asyncio.sleep(5)  # Wait before restarting everything
 
 if __name__ == "__main__":
+    # uvloop cuts per-await overhead on the audio callbacks when it is installed
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
     asyncio.run(main())
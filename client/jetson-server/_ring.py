@@ -0,0 +1,77 @@
+from functools import lru_cache
+
+import numpy as np
+from numba import njit
+
+
+@njit(cache=True, boundscheck=False)
+def ring_write(buf: np.ndarray, pos: int, chunk: np.ndarray) -> int:
+    """
+    Write chunk into the ring buffer at pos, wrapping around the end.
+
+    Args:
+        buf: Ring buffer
+        pos: Current write position
+        chunk: Samples to write (no longer than buf)
+
+    Returns:
+        int: New write position
+    """
+    n = chunk.size
+    size = buf.size
+    end = pos + n
+    if end <= size:
+        buf[pos:end] = chunk
+        return end % size
+    first = size - pos
+    buf[pos:] = chunk[:first]
+    buf[:n - first] = chunk[first:]
+    return n - first
+
+
+@njit(cache=True, boundscheck=False)
+def ring_write_row(buffers: np.ndarray, positions: np.ndarray, idx: int, chunk: np.ndarray) -> int:
+    """
+    Write chunk into row idx of a bank of ring buffers and advance its position.
+
+    Args:
+        buffers: (N, size) ring buffers, one row per microphone
+        positions: (N,) write positions, updated in place
+        idx: Row to write
+        chunk: Samples to write (no longer than a row)
+
+    Returns:
+        int: New write position of the row
+    """
+    pos = ring_write(buffers[idx], positions[idx], chunk)
+    positions[idx] = pos
+    return pos
+
+
+@lru_cache(maxsize=None)
+def ring_writer(size: int):
+    """
+    Build a ring_write kernel specialized for a fixed buffer size.
+
+    The size is a closure constant, so Numba folds it into the compiled
+    code instead of reading buf.size on every call.
+
+    Args:
+        size: Ring buffer length the kernel will be used with
+
+    Returns:
+        Compiled (buf, pos, chunk) -> new position function
+    """
+    @njit(boundscheck=False)
+    def write(buf, pos, chunk):
+        n = chunk.size
+        end = pos + n
+        if end < size:
+            buf[pos:end] = chunk
+            return end
+        first = size - pos
+        buf[pos:] = chunk[:first]
+        buf[:n - first] = chunk[first:]
+        return n - first
+
+    return write
@@ -1,12 +1,11 @@
 import asyncio
 import logging
-import socket
 import time
 import uuid
 import os
 import backoff
-import queue
-from zeroconf import Zeroconf, ServiceBrowser, ServiceListener
+from zeroconf import Zeroconf, ServiceListener
+from zeroconf.asyncio import AsyncZeroconf, AsyncServiceBrowser, AsyncServiceInfo
 from aioesphomeapi import APIClient
 from aioesphomeapi.model import (
     VoiceAssistantAudioData, 
@@ -26,21 +25,45 @@ DEFAULT_UDP_PORT = 12345
 DEFAULT_ENCRYPTION_KEY = "B/ZTOpKW5IyL0jUv9InGeNOpVPdj4+oDO48fmwrh5Ak="
 
 class ESP32DiscoveryListener(ServiceListener):
-    def __init__(self):
+    """
+    Zeroconf listener for ESP32-S3 voice devices.
+
+    Runs under AsyncServiceBrowser, so callbacks arrive on the asyncio loop and
+    service info is resolved there with AsyncServiceInfo instead of blocking
+    the Zeroconf thread. Devices are upserted by MAC.
+    """
+
+    def __init__(self, on_device_found=None):
         self.found_devices = {}
-        # Use a standard threading Queue instead of asyncio.Queue
-        self._device_queue = queue.Queue()
-    
-    def update_service(self, zc: Zeroconf, type_: str, name: str) -> None:
-        info = zc.get_service_info(type_, name)
-        if info and info.properties and info.addresses:
+        self._on_device_found = on_device_found
+        self._names = {}  # service name -> mac, for removals
+        self._last_hash = {}  # service name -> hash of last seen address/properties
+        self._tasks = set()
+
+    def _schedule(self, zc: Zeroconf, type_: str, name: str, action: str) -> None:
+        task = asyncio.ensure_future(self._resolve_service(zc, type_, name, action))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _resolve_service(self, zc: Zeroconf, type_: str, name: str, action: str) -> None:
+        """Resolve a service and record it if it is an ESP32-S3"""
+        info = AsyncServiceInfo(type_, name)
+        if not await info.async_request(zc, 3000):
+            return
+        if info.properties and info.addresses:
+            # Periodic re-announcements usually carry nothing new, skip them before decoding
+            h = hash((info.addresses[0], info.port, info.server, tuple(sorted(info.properties.items()))))
+            if self._last_hash.get(name) == h:
+                return
+            self._last_hash[name] = h
+            
             mac = info.properties.get(b'mac', b'').decode('utf-8')
-            ip = socket.inet_ntoa(info.addresses[0])
+            ip = info.parsed_addresses()[0]
             hostname = info.server.lower()
             port = info.port
             
             if "esp32s3" in hostname:
-                logger.info(f"Updated ESP32-S3 at {ip}:{port}")
+                logger.info(f"{action} ESP32-S3 at {ip}:{port}")
                 
                 # Create device info dictionary
                 device_info = {
@@ -55,43 +78,22 @@ class ESP32DiscoveryListener(ServiceListener):
                 }
                 
                 self.found_devices[mac] = device_info
-                # Add to thread-safe queue
-                self._device_queue.put(device_info)
+                self._names[name] = mac
+                if self._on_device_found:
+                    self._on_device_found(device_info)
+
+    def add_service(self, zc: Zeroconf, type_: str, name: str) -> None:
+        self._schedule(zc, type_, name, "Found")
     
-    def remove_service(self, zc: Zeroconf, type_: str, name: str) -> None:
-        info = zc.get_service_info(type_, name)
-        if info and info.properties:
-            mac = info.properties.get(b'mac', b'').decode('utf-8')
-            if mac in self.found_devices:
-                logger.info(f"Device removed: {mac}")
-                del self.found_devices[mac]
+    def update_service(self, zc: Zeroconf, type_: str, name: str) -> None:
+        self._schedule(zc, type_, name, "Updated")
     
-    def add_service(self, zc: Zeroconf, type_: str, name: str) -> None:
-        info = zc.get_service_info(type_, name)
-        if info and info.properties and info.addresses:
-            mac = info.properties.get(b'mac', b'').decode('utf-8')
-            ip = socket.inet_ntoa(info.addresses[0])
-            hostname = info.server.lower()
-            port = info.port
-            
-            if "esp32s3" in hostname:
-                logger.info(f"Found ESP32-S3 at {ip}:{port}")
-                
-                # Create device info dictionary
-                device_info = {
-                    'mac': mac,
-                    'ip': ip,
-                    'port': port,
-                    'hostname': hostname,
-                    'properties': {
-                        k.decode('utf-8'): v.decode('utf-8') 
-                        for k, v in info.properties.items()
-                    }
-                }
-                
-                self.found_devices[mac] = device_info
-                # Add to thread-safe queue
-                self._device_queue.put(device_info)
+    def remove_service(self, zc: Zeroconf, type_: str, name: str) -> None:
+        mac = self._names.pop(name, None)
+        self._last_hash.pop(name, None)
+        if mac in self.found_devices:
+            logger.info(f"Device removed: {mac}")
+            del self.found_devices[mac]
 
 class VoiceAssistantClient:
     def __init__(self, host: str, encryption_key: str = None, port: int = DEFAULT_PORT, udp_port: int = DEFAULT_UDP_PORT):
@@ -226,7 +228,6 @@ class ESP32VoiceSystem:
         self.discovery_listener = None
         self.discovery_task = None
         self.client_tasks = {}
-        self.device_processor_task = None
         self._running = True
     
     def on_device_found(self, device_info):
@@ -268,37 +269,15 @@ class ESP32VoiceSystem:
             self.client_tasks[mac] = asyncio.create_task(client.run())
             logger.info(f"Started voice assistant client for {ip} (MAC: {mac})")
     
-    async def process_discovered_devices(self):
-        """Process discovered devices from the queue in the main event loop"""
-        logger.info("Starting device processor task")
-        while self._running:
-            try:
-                # Check if there are any devices in the queue
-                try:
-                    # Non-blocking check of queue with timeout
-                    device_info = self.discovery_listener._device_queue.get(block=False)
-                    
-                    # Process device in main event loop
-                    self.on_device_found(device_info)
-                except queue.Empty:
-                    # No devices in queue, wait a bit
-                    await asyncio.sleep(0.1)
-            except asyncio.CancelledError:
-                logger.info("Device processor task cancelled")
-                break
-            except Exception as e:
-                logger.error(f"Error processing discovered device: {e}")
-                await asyncio.sleep(1)  # Wait before trying again
-    
     async def start_discovery(self):
         """Start the discovery process"""
         logger.info("Starting ESP32 discovery...")
-        self.zeroconf = Zeroconf()
-        self.discovery_listener = ESP32DiscoveryListener()
-        self.browser = ServiceBrowser(self.zeroconf, "_esphomelib._tcp.local.", self.discovery_listener)
-        
-        # Start the device processor task
-        self.device_processor_task = asyncio.create_task(self.process_discovered_devices())
+        self.zeroconf = AsyncZeroconf()
+        # Discovered devices are handed to on_device_found directly on the event loop
+        self.discovery_listener = ESP32DiscoveryListener(self.on_device_found)
+        self.browser = AsyncServiceBrowser(
+            self.zeroconf.zeroconf, "_esphomelib._tcp.local.", listener=self.discovery_listener
+        )
         
         # Start the discovery loop task
         self.discovery_task = asyncio.create_task(self._discovery_loop())
@@ -334,14 +313,6 @@ class ESP32VoiceSystem:
         logger.info("Stopping all services...")
         self._running = False
         
-        # Cancel device processor task
-        if self.device_processor_task:
-            self.device_processor_task.cancel()
-            try:
-                await self.device_processor_task
-            except asyncio.CancelledError:
-                pass
-        
         # Cancel discovery
         if self.discovery_task:
             self.discovery_task.cancel()
@@ -351,8 +322,11 @@ class ESP32VoiceSystem:
                 pass
         
         # Close Zeroconf
+        if self.browser:
+            await self.browser.async_cancel()
+            self.browser = None
         if self.zeroconf:
-            self.zeroconf.close()
+            await self.zeroconf.async_close()
             self.zeroconf = None
         
         # Stop all clients
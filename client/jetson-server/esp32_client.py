@@ -2,13 +2,16 @@ import asyncio
 import logging
 from aioesphomeapi import APIClient
 import socket
+import concurrent.futures
 import numpy as np
 from wake_word.detector import WakeWordDetector
+from _ring import ring_write_row
 import backoff
 import uuid
+from collections import deque
 from dataclasses import dataclass
-from typing import Dict, Optional, Callable, List
-import time
+from typing import Dict, Optional, Callable, List, Tuple
+from time import monotonic
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s'
@@ -25,25 +28,178 @@ class MicrophoneConfig:
     detection_cooldown: float = 0.5
     model_path: str = "../models/mirfa.onnx"
 
+class MicrophoneBank:
+    """Per-microphone audio state stored as arrays, one row per microphone"""
+
+    def __init__(self, buffer_size: int = 8000, capacity: int = 4):
+        self.buffer_size = buffer_size
+        self.count = 0
+        self.buffers = np.zeros((capacity, buffer_size), dtype=np.int16)
+        self.positions = np.zeros(capacity, dtype=np.int32)
+        self.pending = np.zeros(capacity, dtype=np.int32)  # Samples not yet sent to the detector
+        self.last_detect = np.zeros(capacity, dtype=np.float64)  # time.monotonic() of last hit
+        self._free: List[int] = []  # Rows given back by removed microphones
+
+    def allocate(self) -> int:
+        """Reserve a row for a new microphone, reusing a released row or doubling the arrays when full"""
+        if self._free:
+            idx = self._free.pop()
+            self.reset(idx)
+            return idx
+        if self.count == len(self.positions):
+            capacity = 2 * len(self.positions)
+            buffers = np.zeros((capacity, self.buffer_size), dtype=np.int16)
+            buffers[:self.count] = self.buffers
+            self.buffers = buffers
+            self.positions = np.resize(self.positions, capacity)
+            self.pending = np.resize(self.pending, capacity)
+            self.last_detect = np.resize(self.last_detect, capacity)
+        idx = self.count
+        self.count += 1
+        self.reset(idx)
+        return idx
+
+    def release(self, idx: int):
+        """Give a row back so the next microphone added can reuse it"""
+        if 0 <= idx < self.count and idx not in self._free:
+            self.reset(idx)
+            self._free.append(idx)
+
+    def take_pending(self, idx: int) -> np.ndarray:
+        """Copy out the samples of a row the detector has not seen yet, oldest first"""
+        n = int(self.pending[idx])
+        self.pending[idx] = 0
+        row = self.buffers[idx]
+        end = int(self.positions[idx])
+        start = end - n
+        if start >= 0:
+            return row[start:end].copy()
+        return np.concatenate((row[start:], row[:end]))
+
+    def reset(self, idx: int):
+        """Clear the audio state of a row"""
+        self.buffers[idx] = 0
+        self.positions[idx] = 0
+        self.pending[idx] = 0
+        self.last_detect[idx] = 0
+
+class BatchedWakeWordDetector:
+    """Coalesce wake word requests from several microphones into one inference pass per tick"""
+
+    def __init__(self, detector: WakeWordDetector, interval: float = 0.02):
+        self.detector = detector
+        self.interval = interval  # How long to wait for other microphones to join a batch
+        self.queue: List[Tuple[str, np.ndarray, asyncio.Future]] = []
+        self._inflight: List[Tuple[str, np.ndarray, asyncio.Future]] = []  # Batch in the executor
+        self._pending = asyncio.Event()
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="wakeword")
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the batching task"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the batching task and fail any waiting requests"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        for _, _, future in self.queue + self._inflight:
+            if not future.done():
+                future.cancel()
+        self.queue = []
+        self._inflight = []
+        self._pool.shutdown(wait=False)
+
+    async def detect(self, mic_id: str, audio: np.ndarray) -> bool:
+        """Queue a window for the next batch and wait for its result"""
+        future = asyncio.get_running_loop().create_future()
+        self.queue.append((mic_id, audio, future))
+        self._pending.set()
+        return await future
+
+    def _detect_batch(self, batch: List[Tuple[str, np.ndarray, asyncio.Future]]) -> List[bool]:
+        """Run every queued window through the detector in one executor call"""
+        return [self.detector.detect(audio, mic_id) for mic_id, audio, _ in batch]
+
+    async def _run(self):
+        """Drain the queue once per interval and resolve each request"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._pending.wait()
+            await asyncio.sleep(self.interval)
+            batch, self.queue = self.queue, []
+            self._pending.clear()
+            # Tracked so stop() can cancel callers whose batch is still in the executor
+            self._inflight = batch
+            try:
+                results = await loop.run_in_executor(self._pool, self._detect_batch, batch)
+            except Exception as e:
+                logger.error(f"Batched wake word detection failed: {e}")
+                results = [False] * len(batch)
+            finally:
+                self._inflight = []
+            for (_, _, future), detected in zip(batch, results):
+                if not future.done():
+                    future.set_result(detected)
+
 class MicrophoneClient:
-    def __init__(self, config: MicrophoneConfig):
+    def __init__(
+        self,
+        config: MicrophoneConfig,
+        bank: Optional[MicrophoneBank] = None,
+        batcher: Optional[BatchedWakeWordDetector] = None,
+        api_client: Optional[APIClient] = None
+    ):
         self.config = config
         self.id = str(uuid.uuid4())
         self._running = False
         self.udp_server = None
-        self.api_client = APIClient(
+        self.last_trigger = 0.0  # time.monotonic() of the last pipeline this mic started
+        # A hub may hand in an already connected client shared by every mic on the host,
+        # it then also owns the voice assistant subscription and dispatches the events
+        self._shared_api = api_client is not None
+        self.api_client = api_client or APIClient(
             config.host,
             config.port,
             password="",
             noise_psk=config.encryption_key
         )
-        self.detector = WakeWordDetector(model_path=config.model_path)
-        self.last_detection = 0
+        # With a hub batcher the detector and its inference thread are shared
+        self.batcher = batcher
+        self.detector = batcher.detector if batcher else WakeWordDetector(model_path=config.model_path)
+        # Without a batcher inference runs on this mic's own thread so UDP intake is
+        # never blocked, the batcher thread does it otherwise
+        self._infer_pool = None
+        if batcher is None:
+            self._infer_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="wakeword")
+        self._detect_task: Optional[asyncio.Task] = None  # At most one detection in flight
         
-        # Audio processing state
-        self.audio_buffer = np.zeros(config.buffer_size, dtype=np.int16)
-        self.buffer_position = 0
-        self.buffer_filled = False
+        # Audio processing state lives in a row of the (possibly shared) bank
+        self.bank = bank if bank is not None else MicrophoneBank(config.buffer_size, capacity=1)
+        self.index = self.bank.allocate()
+        # Preallocated scratch for the 32kHz -> 16kHz downsample
+        self._scratch = np.empty(2048, dtype=np.int16)
+        self._scratch_odd = np.empty(2048, dtype=np.int16)
+        self.detect_chunk = 1280  # 80 ms, one openwakeword frame per detection call
+        # Conversation ids are generated ahead of time, off the detection path
+        self._uuid_pool: deque = deque(maxlen=32)
+        self._refill_uuid_pool()
+
+    def _refill_uuid_pool(self):
+        """Top the conversation id pool back up"""
+        while len(self._uuid_pool) < self._uuid_pool.maxlen:
+            self._uuid_pool.append(str(uuid.uuid4()))
+
+    def _next_conversation_id(self) -> str:
+        """Take a pregenerated conversation id, refilling the pool later when it runs low"""
+        if not self._uuid_pool:
+            self._refill_uuid_pool()
+        conversation_id = self._uuid_pool.popleft()
+        if len(self._uuid_pool) < 8:
+            asyncio.get_running_loop().call_soon(self._refill_uuid_pool)
+        return conversation_id
 
     async def start(self):
         """Start both API connection and UDP server"""
@@ -56,11 +212,28 @@ class MicrophoneClient:
         """Stop all components gracefully"""
         self._running = False
         await self._stop_udp_server()
+        if self._detect_task is not None:
+            self._detect_task.cancel()
+            try:
+                await self._detect_task
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                logger.error(f"Microphone {self.id} detection failed: {e}")
+            self._detect_task = None
         await self._disconnect_api()
+        if self._infer_pool:
+            self._infer_pool.shutdown(wait=False)
+        if self.index >= 0:
+            self.bank.release(self.index)
+            self.index = -1
 
     @backoff.on_exception(backoff.expo, Exception, max_tries=5)
     async def _connect_api(self):
         """Connect to ESPHome API with retry"""
+        if self._shared_api:
+            # The hub connected the device and subscribed once for all of its mics
+            return
         await self.api_client.connect(login=True)
         logger.info(f"Connected to microphone {self.id} at {self.config.host}")
         
@@ -82,6 +255,12 @@ class MicrophoneClient:
         """Start UDP server for audio streaming"""
         self.udp_server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.udp_server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # Ask for a 2 MiB receive buffer so inference stalls do not drop packets. Linux caps
+        # the request at net.core.rmem_max (about 208 KiB by default, a few seconds of audio),
+        # raise it with `sysctl -w net.core.rmem_max=4194304` to get the full size
+        self.udp_server.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 2 * 1024 * 1024)
+        rcvbuf = self.udp_server.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+        logger.info(f"Microphone {self.id} UDP receive buffer is {rcvbuf // 1024} KiB")
         self.udp_server.bind(('0.0.0.0', self.config.udp_port))
         self.udp_server.setblocking(False)
         logger.info(f"Microphone {self.id} UDP server started on port {self.config.udp_port}")
@@ -120,58 +299,78 @@ class MicrophoneClient:
         """Process incoming UDP packets"""
         try:
             while True:
-                print("cjeclom")
                 data, _ = await asyncio.get_event_loop().sock_recvfrom(
                     self.udp_server, 4096
                 )
-                print("cjeclomsas")
                 await self._process_audio_data(data)
         except (BlockingIOError, InterruptedError):
             pass
 
+    def _downsample(self, data: bytes) -> np.ndarray:
+        """Downsample 32kHz int16 PCM to 16kHz by averaging sample pairs into a scratch buffer"""
+        src = np.frombuffer(data, dtype=np.int16)
+        n = src.size // 2
+        if n > self._scratch.size:
+            self._scratch = np.empty(n, dtype=np.int16)
+            self._scratch_odd = np.empty(n, dtype=np.int16)
+        out = self._scratch[:n]
+        odd = self._scratch_odd[:n]
+        # Halve before adding so the int16 sum cannot overflow
+        np.right_shift(src[0:2 * n:2], 1, out=out)
+        np.right_shift(src[1:2 * n:2], 1, out=odd)
+        np.add(out, odd, out=out)
+        return out
+
     async def _process_audio_data(self, data: bytes):
         """Process audio data for wake word detection"""
-        print("in audio")
-        audio_chunk = np.frombuffer(data, dtype=np.int16)[::2]  # Downsample to 16kHz
-        
-        # Update ring buffer
-        chunk_size = len(audio_chunk)
-        start_pos = self.buffer_position
-        end_pos = start_pos + chunk_size
+        audio_chunk = self._downsample(data)  # Downsample to 16kHz
         
-        if end_pos > self.config.buffer_size:
-            wrap_pos = end_pos - self.config.buffer_size
-            self.audio_buffer[start_pos:] = audio_chunk[:self.config.buffer_size - start_pos]
-            self.audio_buffer[:wrap_pos] = audio_chunk[self.config.buffer_size - start_pos:]
-            self.buffer_position = wrap_pos
-        else:
-            self.audio_buffer[start_pos:end_pos] = audio_chunk
-            self.buffer_position = end_pos
+        # Update this microphone's ring buffer row
+        bank = self.bank
+        idx = self.index
+        ring_write_row(bank.buffers, bank.positions, idx, audio_chunk)
+        # Unsent audio is capped at the ring size, older samples have been overwritten
+        bank.pending[idx] = min(bank.pending[idx] + len(audio_chunk), bank.buffer_size)
 
-        # Check if buffer is filled and detect wake word
-        if self.buffer_position >= self.config.buffer_size:
-            self.buffer_filled = True
-            self.buffer_position = 0
+        # The detector streams, so run it once a full 80 ms frame of new audio is waiting.
+        # Detect in the background so packet intake continues during inference, the
+        # task is tracked synchronously so packets arriving meanwhile do not start another
+        if bank.pending[idx] >= self.detect_chunk and (self._detect_task is None or self._detect_task.done()):
+            self._detect_task = asyncio.create_task(self._detect_and_trigger())
 
-        if self.buffer_filled and self._check_wake_word():
+    async def _detect_and_trigger(self):
+        """Run wake word detection and trigger the assistant on a hit"""
+        if await self._check_wake_word():
             logger.info(f"Wake word detected on microphone {self.id}")
             await self._trigger_assistant()
 
-    def _check_wake_word(self) -> bool:
-        """Check for wake word with cooldown"""
-        current_time = time.time()
-        if current_time - self.last_detection < self.config.detection_cooldown:
+    async def _check_wake_word(self) -> bool:
+        """Check for wake word with cooldown, callers keep at most one check in flight"""
+        if not self._running:
+            return False
+        bank = self.bank
+        current_time = monotonic()
+        if current_time - bank.last_detect[self.index] < self.config.detection_cooldown:
             return False
         
-        if self.detector.detect(self.audio_buffer):
-            self.last_detection = current_time
+        # Copy out only the new audio, the ring keeps being written while the detector runs
+        window = bank.take_pending(self.index)
+        if self.batcher:
+            detected = await self.batcher.detect(self.id, window)
+        else:
+            detected = await asyncio.get_running_loop().run_in_executor(
+                self._infer_pool, self.detector.detect, window, self.id
+            )
+        if detected:
+            bank.last_detect[self.index] = current_time
             return True
         return False
 
     async def _trigger_assistant(self):
         """Trigger voice assistant pipeline"""
+        self.last_trigger = monotonic()
         await self.api_client.send_voice_assistant_audio_settings(
-            conversation_id=str(uuid.uuid4()),
+            conversation_id=self._next_conversation_id(),
             flags=0,
             audio_settings=VoiceAssistantAudioSettings(
                 noise_suppression_level=1,
@@ -190,19 +389,105 @@ class MicrophoneClient:
         logger.info(f"Pipeline stopped on {self.id} (server_side: {server_side})")
 
     async def _handle_audio(self, data: bytes):
-        print("in handle")
         """Handle audio data from ESPHome"""
         # Implement if needed for bidirectional communication
         pass
 
+@dataclass
+class SharedDevice:
+    """One ESPHome API connection and voice assistant subscription, shared by the mics on a device"""
+    api_client: APIClient
+    mics: List[MicrophoneClient]
+    unsubscribe: Optional[Callable[[], None]] = None
+
+    def active_mic(self) -> Optional[MicrophoneClient]:
+        """The mic whose wake word started the device's current pipeline"""
+        return max(self.mics, key=lambda mic: mic.last_trigger, default=None)
+
+    async def handle_pipeline_start(self, conversation_id: str, flags: int, audio_settings, wake_word_phrase: str = None):
+        mic = self.active_mic()
+        if mic is None:
+            return None
+        return await mic._handle_pipeline_start(conversation_id, flags, audio_settings, wake_word_phrase)
+
+    async def handle_pipeline_stop(self, server_side: bool):
+        mic = self.active_mic()
+        if mic is not None:
+            await mic._handle_pipeline_stop(server_side)
+
+    async def handle_audio(self, data: bytes):
+        mic = self.active_mic()
+        if mic is not None:
+            await mic._handle_audio(data)
+
 class VoiceAssistantHub:
     def __init__(self):
         self.microphones: Dict[str, MicrophoneClient] = {}
+        self.bank = MicrophoneBank()
+        self.batcher: Optional[BatchedWakeWordDetector] = None
+        # One API connection and subscription per (host, port, key)
+        self._devices: Dict[tuple, SharedDevice] = {}
         self._running = False
 
+    @staticmethod
+    def _api_key(config: MicrophoneConfig) -> tuple:
+        return (config.host, config.port, config.encryption_key)
+
+    @backoff.on_exception(backoff.expo, Exception, max_tries=5)
+    async def _connect_shared_api(self, api_client: APIClient):
+        """Connect a shared ESPHome API client with retry"""
+        await api_client.connect(login=True)
+
+    async def _acquire_device(self, config: MicrophoneConfig) -> SharedDevice:
+        """Get the connected device for a microphone, connecting and subscribing on first use"""
+        key = self._api_key(config)
+        device = self._devices.get(key)
+        if device is None:
+            api_client = APIClient(
+                config.host,
+                config.port,
+                password="",
+                noise_psk=config.encryption_key
+            )
+            await self._connect_shared_api(api_client)
+            logger.info(f"Connected to ESPHome device at {config.host}")
+            device = SharedDevice(api_client, [])
+            # Subscribe once per device, events go to the mic that triggered the pipeline
+            device.unsubscribe = api_client.subscribe_voice_assistant(
+                handle_start=device.handle_pipeline_start,
+                handle_stop=device.handle_pipeline_stop,
+                handle_audio=device.handle_audio
+            )
+            self._devices[key] = device
+        return device
+
+    async def _release_device(self, mic: MicrophoneClient):
+        """Drop a microphone from its device, unsubscribing and disconnecting after the last one"""
+        key = self._api_key(mic.config)
+        device = self._devices.get(key)
+        if device is None:
+            return
+        if mic in device.mics:
+            device.mics.remove(mic)
+        if not device.mics:
+            del self._devices[key]
+            try:
+                if device.unsubscribe:
+                    device.unsubscribe()
+                await device.api_client.disconnect()
+                logger.info(f"Disconnected from ESPHome device at {mic.config.host}")
+            except Exception as e:
+                logger.error(f"Error disconnecting from {mic.config.host}: {e}")
+
     async def add_microphone(self, config: MicrophoneConfig) -> str:
         """Add and start a new microphone client"""
-        client = MicrophoneClient(config)
+        # One detector serves every microphone, built from the first config
+        if self.batcher is None:
+            self.batcher = BatchedWakeWordDetector(WakeWordDetector(model_path=config.model_path))
+            self.batcher.start()
+        device = await self._acquire_device(config)
+        client = MicrophoneClient(config, self.bank, self.batcher, device.api_client)
+        device.mics.append(client)
         mic_id = client.id
         self.microphones[mic_id] = client
         await client.start()
@@ -211,8 +496,9 @@ class VoiceAssistantHub:
     async def remove_microphone(self, mic_id: str):
         """Remove and stop a microphone client"""
         if mic_id in self.microphones:
-            await self.microphones[mic_id].stop()
-            del self.microphones[mic_id]
+            mic = self.microphones.pop(mic_id)
+            await mic.stop()
+            await self._release_device(mic)
 
     async def run(self):
         """Main hub operation"""
@@ -225,7 +511,11 @@ class VoiceAssistantHub:
         self._running = False
         for mic in self.microphones.values():
             await mic.stop()
+            await self._release_device(mic)
         self.microphones.clear()
+        if self.batcher:
+            await self.batcher.stop()
+            self.batcher = None
 
 async def main():
     hub = VoiceAssistantHub()
@@ -249,4 +539,10 @@ async def main():
         await hub.stop()
 
 if __name__ == "__main__":
+    # uvloop cuts per-packet loop overhead on the UDP path when it is installed
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
     asyncio.run(main())
\ No newline at end of file
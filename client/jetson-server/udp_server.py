@@ -3,6 +3,7 @@ import logging
 import socket
 import time
 import numpy as np
+from _ring import ring_writer
 
 logging.basicConfig(
     level=logging.INFO,
@@ -10,6 +11,21 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+class _AudioProtocol(asyncio.DatagramProtocol):
+    """Hands each datagram to the server synchronously from the selector callback."""
+
+    def __init__(self, server: 'AudioUDPServer'):
+        self.server = server
+
+    def datagram_received(self, data: bytes, addr):
+        self.server.on_datagram(data)
+
+    def error_received(self, exc: Exception):
+        logger.error(f"Error in receive loop: {exc}")
+
+    def connection_lost(self, exc):
+        self.server.closed.set()
+
 class AudioUDPServer:
     def __init__(self, host: str = '0.0.0.0', port: int = 12345):
         self.host = host
@@ -24,6 +40,12 @@ class AudioUDPServer:
         self.audio_buffer = np.zeros(self.buffer_size, dtype=np.int16)
         self.buffer_position = 0
         self.buffer_filled = False
+        self._ring_write = ring_writer(self.buffer_size)
+        # Preallocated scratch for the 32kHz -> 16kHz downsample
+        self._scratch = np.empty(2048, dtype=np.int16)
+        self._scratch_odd = np.empty(2048, dtype=np.int16)
+        self.transport = None
+        self.closed = asyncio.Event()
 
     async def start(self):
         """Start the UDP server."""
@@ -33,72 +55,69 @@ class AudioUDPServer:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
             self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             
-            # Set buffer sizes
-            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 65536)
+            # Ask for a 2 MiB receive buffer so stalls do not drop packets. Linux caps the
+            # request at net.core.rmem_max (about 208 KiB by default, a few seconds of audio),
+            # raise it with `sysctl -w net.core.rmem_max=4194304` to get the full size
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 2 * 1024 * 1024)
             self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 65536)
+            rcvbuf = self.socket.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+            logger.info(f"UDP receive buffer is {rcvbuf // 1024} KiB")
             
             self.socket.bind((self.host, self.port))
             self.socket.setblocking(False)
+            
+            # Datagrams are delivered straight to on_datagram, no per-packet future
+            loop = asyncio.get_running_loop()
+            self.transport, _ = await loop.create_datagram_endpoint(
+                lambda: _AudioProtocol(self), sock=self.socket
+            )
             self._running = True
             
             logger.info(f"UDP Server started successfully")
-            await self.receive_loop()
+            await self.closed.wait()
 
         except Exception as e:
             logger.error(f"Failed to start UDP server: {e}")
             raise
 
-    async def receive_loop(self):
-        """Main loop for receiving audio data."""
-        logger.info("Starting UDP receive loop")
-        buffer_size = 4096
-        
-        while self._running and self.socket:
-            try:
-                loop = asyncio.get_event_loop()
-                data, addr = await loop.sock_recvfrom(self.socket, buffer_size)
-                
-                self.last_packet_time = time.time()
-                self.packets_received += 1
-
-                await self.process_audio(data)
+    def on_datagram(self, data: bytes):
+        """Handle one received datagram."""
+        self.last_packet_time = time.time()
+        self.packets_received += 1
+        self.process_audio(data)
 
-            except (BlockingIOError, InterruptedError):
-                await asyncio.sleep(0.001)
-            except Exception as e:
-                logger.error(f"Error in receive loop: {e}")
-                await asyncio.sleep(0.1)
+    def _downsample(self, data: bytes) -> np.ndarray:
+        """Downsample 32kHz int16 PCM to 16kHz by averaging sample pairs into a scratch buffer"""
+        src = np.frombuffer(data, dtype=np.int16)
+        n = src.size // 2
+        if n > self._scratch.size:
+            self._scratch = np.empty(n, dtype=np.int16)
+            self._scratch_odd = np.empty(n, dtype=np.int16)
+        out = self._scratch[:n]
+        odd = self._scratch_odd[:n]
+        # Halve before adding so the int16 sum cannot overflow
+        np.right_shift(src[0:2 * n:2], 1, out=out)
+        np.right_shift(src[1:2 * n:2], 1, out=odd)
+        np.add(out, odd, out=out)
+        return out
 
-    async def process_audio(self, data: bytes):
+    def process_audio(self, data: bytes):
         """Process incoming audio data."""
         try:
-            # Convert and downsample from 32kHz to 16kHz
-            audio_data = np.frombuffer(data, dtype=np.int16)[::2]
-            
-            # Process in fixed-size chunks
-            chunk_size = len(audio_data)
+            # Convert and downsample from 32kHz to 16kHz (contiguous, anti-aliased)
+            audio_data = self._downsample(data)
             
-            # Update ring buffer
-            if self.buffer_position + chunk_size > self.buffer_size:
-                # Split the chunk
-                first_part = self.buffer_size - self.buffer_position
-                second_part = chunk_size - first_part
-                
-                self.audio_buffer[self.buffer_position:] = audio_data[:first_part]
-                self.audio_buffer[:second_part] = audio_data[first_part:]
-                self.buffer_position = second_part
-            else:
-                self.audio_buffer[self.buffer_position:self.buffer_position + chunk_size] = audio_data
-                self.buffer_position += chunk_size
-                
-            if self.buffer_position >= self.buffer_size:
-                self.buffer_position = 0
+            # Update ring buffer, it is full once the write position wraps
+            start_pos = self.buffer_position
+            self.buffer_position = self._ring_write(self.audio_buffer, start_pos, audio_data)
+            if self.buffer_position <= start_pos:
                 self.buffer_filled = True
                 
             # Here you can add your audio processing logic
             if self.buffer_filled:
-                # Example: Log audio buffer statistics
-                logger.debug(f"Audio buffer stats - Mean: {np.mean(self.audio_buffer):.2f}, Max: {np.max(self.audio_buffer)}")
+                # Example: Log audio buffer statistics, only scanning the buffer when debugging
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"Audio buffer stats - Mean: {np.mean(self.audio_buffer, dtype=np.float64):.2f}, Max: {np.max(self.audio_buffer)}")
                 # Add your processing here
                 pass
 
@@ -111,12 +130,16 @@ class AudioUDPServer:
         """Stop the UDP server."""
         logger.info("Stopping UDP server")
         self._running = False
-        if self.socket:
+        if self.transport:
+            self.transport.close()
+            self.transport = None
+        elif self.socket:
             try:
                 self.socket.close()
             except Exception as e:
                 logger.error(f"Error closing UDP socket: {e}")
-            self.socket = None
+        self.socket = None
+        self.closed.set()
         logger.info("UDP Server stopped")
 
 async def main():
@@ -131,4 +154,10 @@ async def main():
         server.stop()
 
 if __name__ == "__main__":
+    # uvloop cuts per-packet loop overhead on the UDP path when it is installed
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
     asyncio.run(main())
\ No newline at end of file
@@ -5,6 +5,7 @@ import socket
 import time
 import numpy as np
 from wake_word.detector import WakeWordDetector
+from audio_processing.resample import Decimator
 import backoff  # Add this dependency
 from aioesphomeapi.model import (
     VoiceAssistantAudioData, 
@@ -12,6 +13,8 @@ from aioesphomeapi.model import (
     VoiceAssistantEventType
 )
 import os
+import concurrent.futures
+import struct
 import uuid
 logging.basicConfig(
     level=logging.INFO,
@@ -19,6 +22,18 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+class _AudioProtocol(asyncio.DatagramProtocol):
+    """Hands each received datagram to the UDP server from the transport callback"""
+
+    def __init__(self, server: 'VoiceAssistantUDPServer'):
+        self.server = server
+
+    def datagram_received(self, data: bytes, addr):
+        self.server.on_datagram(data)
+
+    def error_received(self, exc: Exception):
+        logger.error(f"Connection error in receive loop: {exc}")
+
 class VoiceAssistantUDPServer:
     def __init__(self, host: str = '0.0.0.0', port: int = 12345, max_retries: int = 3):
         self.host = host
@@ -35,6 +50,7 @@ class VoiceAssistantUDPServer:
         self.error_threshold = 5  # Max errors per minute
         self.error_count = 0
         self.last_error_reset = time.time()
+        self.transport = None
 
     def set_audio_callback(self, callback):
         self.audio_callback = callback
@@ -52,18 +68,18 @@ class VoiceAssistantUDPServer:
                 # Add keep-alive for TCP connections
                 self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
                 
-                # Set larger buffer sizes
-                self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 65536)
+                # Set larger buffer sizes, 1 MiB absorbs bursts while the loop is busy
+                self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024 * 1024)
                 self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 65536)
                 
                 self.socket.bind((self.host, current_port))
                 self.socket.setblocking(False)
+                await self._create_endpoint()
                 self._running = True
                 self.port = current_port  # Update with successful port
                 
                 logger.info(f"UDP Server started successfully on {self.host}:{self.port}")
                 asyncio.create_task(self.monitor_connection())
-                asyncio.create_task(self.receive_loop())
                 return self.port
 
             except OSError as e:
@@ -98,67 +114,58 @@ class VoiceAssistantUDPServer:
             logger.info("Attempting connection recovery")
             
             # Close existing socket
-            if self.socket:
+            if self.transport:
+                self.transport.close()
+                self.transport = None
+            elif self.socket:
                 self.socket.close()
                 
             # Attempt to recreate socket
             try:
                 self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
                 self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024 * 1024)
                 self.socket.bind((self.host, self.port))
                 self.socket.setblocking(False)
+                await self._create_endpoint()
                 logger.info("Successfully recovered connection")
             except Exception as e:
                 logger.error(f"Recovery attempt failed: {e}")
 
-    @backoff.on_exception(
-        backoff.expo,
-        (ConnectionError, socket.error),
-        max_tries=5,
-        max_time=30
-    )
-    async def receive_loop(self):
-        """Continuously receive UDP packets with exponential backoff retry"""
-        logger.info("Starting UDP receive loop")
-        buffer_size = 4096  # Increased buffer size
-        
-        while self._running and self.socket:
+    async def _create_endpoint(self):
+        """Attach the bound socket to a datagram transport that delivers packets to on_datagram"""
+        loop = asyncio.get_running_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(
+            lambda: _AudioProtocol(self), sock=self.socket
+        )
+
+    def on_datagram(self, data: bytes):
+        """Handle one received UDP packet"""
+        # Update connection monitoring
+        self.last_packet_time = time.time()
+        self.packets_received += 1
+
+        # Process received data
+        # The callback is synchronous, packets are handled inline in arrival order
+        if self.audio_callback and len(data) > 0:
             try:
-                loop = asyncio.get_event_loop()
-                data, addr = await loop.sock_recvfrom(self.socket, buffer_size)
-                
-                # Update connection monitoring
-                self.last_packet_time = time.time()
-                self.packets_received += 1
-
-                # Process received data
-                if self.audio_callback and len(data) > 0:
-                    try:
-                        await self.audio_callback(data)
-                    except Exception as e:
-                        logger.error(f"Error in audio callback: {e}")
-
-            except (BlockingIOError, InterruptedError):
-                await asyncio.sleep(0.001)
-            except ConnectionError as e:
-                logger.error(f"Connection error in receive loop: {e}")
-                await self.attempt_recovery()
-                raise  # Allow backoff to handle retry
+                self.audio_callback(data)
             except Exception as e:
-                logger.error(f"Unexpected error in receive loop: {e}")
-                await asyncio.sleep(0.1)
+                logger.error(f"Error in audio callback: {e}")
 
     def stop(self):
         """Stop the UDP server gracefully"""
         logger.info("Stopping UDP server")
         self._running = False
-        if self.socket:
+        if self.transport:
+            self.transport.close()
+            self.transport = None
+        elif self.socket:
             try:
-                self.socket.shutdown(socket.SHUT_RDWR)
                 self.socket.close()
             except Exception as e:
                 logger.error(f"Error closing UDP socket: {e}")
-            self.socket = None
+        self.socket = None
         logger.info("UDP Server stopped")
 
 class VoiceAssistantClient:
@@ -173,55 +180,133 @@ class VoiceAssistantClient:
         self.voice_assistant_udp_server = None
 
         self.buffer_position = 0
-        self.buffer_size = 8000  # 0.5 seconds at 16kHz
+        self.buffer_size = 8192  # ~0.5 seconds at 16kHz, a power of two so wrapping is a mask
+        self.buffer_mask = self.buffer_size - 1
         self.audio_buffer = np.zeros(self.buffer_size, dtype=np.int16)
-        self.buffer_filled = False
+        self.buffer_pending = 0  # Samples not yet sent to the detector
+        self.detect_chunk = 1280  # 80 ms, one openwakeword frame per detection call
+        self.decimator = Decimator()  # Anti-aliased 32kHz -> 16kHz
         
         # Add detection state management
         self.last_detection_time = 0
         self.detection_cooldown = 0.5  
         self.detector = WakeWordDetector(model_path="/home/abc/smart-hub/models/mirfa.onnx");
+        self.mic_id = host  # The detector keeps its streaming state per microphone id
+        # Inference runs on its own thread with at most one window in flight
+        self._infer_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="wwd")
+        self._infer_inflight = None
         
         # Ensure recordings directory exists
         os.makedirs('recordings', exist_ok=True)
+        self._wav_fd = None  # Open recording while a pipeline runs
+        self._wav_pending = bytearray()  # PCM not yet written to the file
+        self._wav_data_bytes = 0
         
         # Configure reconnection settings
         self._request_timeout = 30  # Used in connect method
-    async def handle_audio(self, data: bytes) -> None:
+    def _start_recording(self):
+        """Open a WAV recording for the current pipeline, the header is written on close"""
+        filename = os.path.join('recordings', f"{self.conversation_id}_{time.strftime('%Y%m%d_%H%M%S')}.wav")
+        self._wav_fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        os.write(self._wav_fd, bytes(44))  # Placeholder header
+        self._wav_pending.clear()
+        self._wav_data_bytes = 0
+        logger.info(f"Recording to {filename}")
+
+    def _flush_recording(self):
+        """Write the pending PCM to the recording in one call"""
+        if self._wav_pending:
+            os.write(self._wav_fd, self._wav_pending)
+            self._wav_data_bytes += len(self._wav_pending)
+            self._wav_pending.clear()
+
+    async def save_recording(self):
+        """Finish the current recording, flushing pending audio and patching the WAV header"""
+        if self._wav_fd is None:
+            return
+        try:
+            self._flush_recording()
+            # 32kHz mono 16-bit PCM
+            header = struct.pack(
+                '<4sI4s4sIHHIIHH4sI',
+                b'RIFF', 36 + self._wav_data_bytes, b'WAVE',
+                b'fmt ', 16, 1, 1, 32000, 32000 * 2, 2, 16,
+                b'data', self._wav_data_bytes
+            )
+            os.lseek(self._wav_fd, 0, os.SEEK_SET)
+            os.write(self._wav_fd, header)
+        except Exception as e:
+            logger.error(f"Error saving recording: {e}")
+        finally:
+            os.close(self._wav_fd)
+            self._wav_fd = None
+            self._wav_pending.clear()
+
+    async def _handle_api_audio(self, data: bytes) -> None:
+        """Coroutine adapter, the API client expects an async audio handler"""
+        self.handle_audio(data)
+
+    def handle_audio(self, data: bytes) -> None:
         try:
-            # Convert and downsample from 32kHz to 16kHz
-            audio_data = np.frombuffer(data, dtype=np.int16)[::2]
+            # Collect the raw 32kHz packet, written out in 64 KiB batches
+            if self._wav_fd is not None:
+                self._wav_pending += data
+                if len(self._wav_pending) >= 64 * 1024:
+                    self._flush_recording()
+            
+            # Convert and downsample from 32kHz to 16kHz through the anti-alias filter
+            audio_data = self.decimator.process(np.frombuffer(data, dtype=np.int16))
             
             # Process in fixed-size chunks
             chunk_size = len(audio_data)
             
             # Update ring buffer
-            if self.buffer_position + chunk_size > self.buffer_size:
-                # Split the chunk
-                first_part = self.buffer_size - self.buffer_position
-                second_part = chunk_size - first_part
-                
-                self.audio_buffer[self.buffer_position:] = audio_data[:first_part]
-                self.audio_buffer[:second_part] = audio_data[first_part:]
-                self.buffer_position = second_part
+            pos = self.buffer_position
+            end = pos + chunk_size
+            if end <= self.buffer_size:
+                self.audio_buffer[pos:end] = audio_data
             else:
-                self.audio_buffer[self.buffer_position:self.buffer_position + chunk_size] = audio_data
-                self.buffer_position += chunk_size
-                
-            if self.buffer_position >= self.buffer_size:
-                self.buffer_position = 0
-                self.buffer_filled = True
+                split = self.buffer_size - pos
+                self.audio_buffer[pos:] = audio_data[:split]
+                self.audio_buffer[:chunk_size - split] = audio_data[split:]
+            self.buffer_position = end & self.buffer_mask
+            # Unsent audio is capped at the ring size, older samples have been overwritten
+            self.buffer_pending = min(self.buffer_pending + chunk_size, self.buffer_size)
             
-            # Only detect if buffer is filled and cooldown has passed
+            # The detector streams, so only feed it audio it has not seen yet, once a
+            # full frame is waiting, the cooldown has passed and no inference is running
             current_time = time.time()
-            if self.buffer_filled and current_time - self.last_detection_time > self.detection_cooldown:
-                if self.detector.detect(self.audio_buffer):
-                    logger.info("Wake word detected!")
-                    self.last_detection_time = current_time
+            if (self.buffer_pending >= self.detect_chunk and self._infer_inflight is None and
+                    current_time - self.last_detection_time > self.detection_cooldown):
+                window = self._take_pending()
+                self._infer_inflight = asyncio.get_running_loop().run_in_executor(
+                    self._infer_pool, self.detector.detect, window, self.mic_id
+                )
+                self._infer_inflight.add_done_callback(self._on_detect)
                     
         except Exception as e:
             logger.error(f"Error handling audio data: {e}", exc_info=True)
 
+    def _take_pending(self) -> np.ndarray:
+        """Copy out the samples the detector has not seen yet, oldest first"""
+        n = self.buffer_pending
+        self.buffer_pending = 0
+        end = self.buffer_position
+        start = end - n
+        if start >= 0:
+            return self.audio_buffer[start:end].copy()
+        return np.concatenate((self.audio_buffer[start:], self.audio_buffer[:end]))
+
+    def _on_detect(self, future: asyncio.Future):
+        """Handle the result of a background wake word detection"""
+        self._infer_inflight = None
+        try:
+            if future.result():
+                logger.info("Wake word detected!")
+                self.last_detection_time = time.time()
+        except Exception as e:
+            logger.error(f"Error in wake word detection: {e}")
+
     async def handle_pipeline_start(
         self, 
         conversation_id: str, 
@@ -252,6 +337,9 @@ class VoiceAssistantClient:
             # Store conversation details
             self.conversation_id = conversation_id or str(uuid.uuid4())
             self.is_running = True
+            self.decimator.reset()
+            await self.save_recording()
+            self._start_recording()
             
             logger.info(f"Pipeline started - Port: {port}")
             return port
@@ -323,7 +411,7 @@ class VoiceAssistantClient:
             self.client.subscribe_voice_assistant(
                 handle_start=self.handle_pipeline_start,
                 handle_stop=self.handle_stop,
-                handle_audio=self.handle_audio
+                handle_audio=self._handle_api_audio
             )
             logger.info("✅ Subscribed to voice assistant events")
         except Exception as e:
@@ -381,4 +469,10 @@ async def main():
             await asyncio.sleep(5)  # Wait before restarting
 
 if __name__ == "__main__":
+    # uvloop cuts per-packet loop overhead on the UDP path when it is installed
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
     asyncio.run(main())
\ No newline at end of file
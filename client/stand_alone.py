@@ -1,3 +1,10 @@
+import os
+
+# Cap OpenMP/MKL pools before torch and CTranslate2 load, so Whisper and the
+# wake word sessions do not oversubscribe the cores the UDP loop runs on
+os.environ.setdefault("OMP_NUM_THREADS", "2")
+os.environ.setdefault("MKL_NUM_THREADS", "2")
+
 import asyncio
 import logging
 from aioesphomeapi import APIClient
@@ -5,13 +12,15 @@ import socket
 import time
 import numpy as np
 from wake_word.detector import WakeWordDetector
+from audio_processing.resample import Decimator
 from dataclasses import dataclass
-from typing import Dict, Optional, List
-import whisper
+from typing import Dict, Optional
+from faster_whisper import WhisperModel
 import torch
+import concurrent.futures
 from collections import deque
 import webrtcvad
-import struct
+from numba import njit
 
 logging.basicConfig(
     level=logging.DEBUG,
@@ -19,7 +28,30 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@dataclass
+_VAD_FRAME_BYTES = 960  # 30ms of 16kHz int16, a frame length webrtcvad accepts
+
+@njit(cache=True, fastmath=True)
+def i16_to_f32(src, dst, off):
+    """Scale int16 samples into dst[off:] as float32 in [-1, 1) in a single pass"""
+    for i in range(src.size):
+        dst[off + i] = src[i] * (1.0 / 32768.0)
+
+class _AudioProtocol(asyncio.DatagramProtocol):
+    """Hands each received datagram to the bridge from the transport callback"""
+
+    def __init__(self, bridge: 'ESP32UDPBridge'):
+        self.bridge = bridge
+
+    def datagram_received(self, data: bytes, addr):
+        self.bridge.on_datagram(data, addr)
+
+    def error_received(self, exc: Exception):
+        logger.error("Error in main loop: %s", exc)
+
+    def connection_lost(self, exc):
+        self.bridge.closed.set()
+
+@dataclass(slots=True)  # Per-packet field reads skip the instance __dict__
 class ESPDeviceState:
     device_name: str
     last_seen: float
@@ -27,49 +59,82 @@ class ESPDeviceState:
     is_connected: bool = False
     udp_port: Optional[int] = None
     buffer_position: int = 0
-    buffer_size: int = 4000  # 0.5 seconds at 16kHz
+    buffer_size: int = 4096  # ~0.25 seconds at 16kHz of audio not yet sent to the detector
     audio_buffer: np.ndarray = None
+    detect_chunk: int = 1280  # 80 ms, one openwakeword frame per detection call
     buffer_filled: bool = False
-    detector: Optional[WakeWordDetector] = None
-    last_detection_time: float = 0
+    last_detection_time: float = 0  # time.monotonic()
     detection_cooldown: float = 0.3
     is_listening: bool = False
-    main_buffer: Optional[List[float]] = None
-    vad_buffer: Optional[bytes] = None
-    last_voice_activity: float = 0
+    main_buffer: Optional[np.ndarray] = None  # float32 speech samples, valid up to main_len
+    main_len: int = 0
+    spare_buffer: Optional[np.ndarray] = None  # Swapped in for main_buffer, None while Whisper reads it
+    vad_buffer: Optional[bytearray] = None
+    last_voice_activity: float = 0  # time.monotonic()
     voice_timeout: float = 1.0  # Time to wait for more speech before processing
     min_voice_length: int = 16000  # Minimum 1 second of speech before processing
+    decimator: Optional[Decimator] = None
+    infer_inflight: Optional[asyncio.Future] = None  # Pending wake word inference
+    error_logged: bool = False  # Full traceback is only logged for the first audio error
 
     def __post_init__(self):
         self.audio_buffer = np.zeros(self.buffer_size, dtype=np.int16)
-        self.detector = WakeWordDetector(model_path="../models/mirfa.onnx")
-        self.main_buffer = []
-        self.vad_buffer = b''
+        self.main_buffer = np.empty(16000 * 30, dtype=np.float32)  # 30 s, grows if exceeded
+        self.spare_buffer = np.empty_like(self.main_buffer)
+        self.vad_buffer = bytearray()
+        self.decimator = Decimator()  # Anti-aliased 32kHz -> 16kHz
+
+    def append_main(self, samples: np.ndarray):
+        """Append int16 samples to the speech buffer as float32, doubling it when full"""
+        end = self.main_len + samples.size
+        if end > self.main_buffer.size:
+            grown = np.empty(max(end, 2 * self.main_buffer.size), dtype=np.float32)
+            grown[:self.main_len] = self.main_buffer[:self.main_len]
+            self.main_buffer = grown
+        i16_to_f32(samples, self.main_buffer, self.main_len)
+        self.main_len = end
+
+    def clear_main(self):
+        """Drop buffered speech, keeping the allocation"""
+        self.main_len = 0
 
 class ESP32UDPBridge:
     def __init__(
         self,
         udp_host: str = '0.0.0.0',
         udp_port: int = 12345,
-        buffer_size: int = 65536
+        buffer_size: int = 1024 * 1024
     ):
         self.udp_host = udp_host
         self.udp_port = udp_port
         self.buffer_size = buffer_size
         self.udp_socket = None
+        self.transport = None
+        self.closed = asyncio.Event()
+        self._stt_tasks = set()  # Keeps in-flight transcriptions referenced
         self._running = False
         self.esp_devices: Dict[str, ESPDeviceState] = {}
         
-        # Initialize Whisper model with optimizations
-        self.whisper_model = whisper.load_model("tiny.en")
+        # Initialize Whisper model with int8 CTranslate2 weights
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        if self.device == "cuda":
-            self.whisper_model = self.whisper_model.to(self.device)
+        self.whisper_model = WhisperModel(
+            "tiny.en",
+            device=self.device,
+            compute_type="int8" if self.device == "cpu" else "int8_float16",
+            cpu_threads=max(2, (os.cpu_count() or 4) // 2)  # Leave the other half to wake word and intake
+        )
         logger.info(f"Loaded Whisper model on {self.device}")
         
         # Initialize VAD
         self.vad = webrtcvad.Vad(3)  # Aggressiveness level 3
         
+        # One wake word detector serves every device, it keeps per-device state by name
+        self.detector = WakeWordDetector(wake_word_models=[], model_paths=["../models/mirfa.onnx"])
+        
+        # Wake word inference and transcription run on their own threads so UDP intake keeps draining
+        self._infer_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="wwd")
+        self._stt_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="stt")
+        
         # Initialize UDP server
         self.init_udp_server()
 
@@ -87,14 +152,6 @@ class ESP32UDPBridge:
             logger.error(f"Failed to initialize UDP server: {e}")
             raise
 
-    def frame_generator(self, audio: bytes, sample_rate: int, frame_duration: int):
-        """Generate frames of specific duration from audio data"""
-        n = int(sample_rate * (frame_duration / 1000.0) * 2)  # 2 bytes per sample
-        offset = 0
-        while offset + n <= len(audio):
-            yield audio[offset:offset + n]
-            offset += n
-
     def is_speech(self, audio_chunk: bytes, sample_rate: int = 16000) -> bool:
         """Detect if audio chunk contains speech using WebRTC VAD"""
         try:
@@ -102,42 +159,50 @@ class ESP32UDPBridge:
         except:
             return False
 
-    async def transcribe_audio(self, device: ESPDeviceState):
-        """Transcribe audio when appropriate conditions are met"""
-        current_time = time.time()
-        
-        # Check if we have enough silence after speech
-        if (len(device.main_buffer) >= device.min_voice_length and 
-            current_time - device.last_voice_activity > device.voice_timeout):
-            
-            try:
-                # Convert buffer to numpy array
-                audio_data = np.array(device.main_buffer, dtype=np.float32)
+    def _transcribe_sync(self, audio_data: np.ndarray) -> str:
+        """Run Whisper and collect the segment texts, called on the transcription thread"""
+        segments, _ = self.whisper_model.transcribe(
+            audio_data,
+            language='en',
+            beam_size=1,
+            temperature=0.0,
+            without_timestamps=True,
+            vad_filter=False,
+            condition_on_previous_text=True,
+            initial_prompt="Transcribing real-time speech:"
+        )
+        return "".join(segment.text for segment in segments).strip()
+
+    def start_transcription(self, device: ESPDeviceState):
+        """Hand the buffered speech to a background transcription, only this step needs a task"""
+        # Take the buffered speech and swap in the spare buffer, so audio arriving while
+        # Whisper runs is kept and the utterance is not picked up twice. Only if the
+        # previous utterance still holds the spare is a new buffer allocated
+        buffer = device.main_buffer
+        audio_data = buffer[:device.main_len]
+        spare = device.spare_buffer
+        device.main_buffer = spare if spare is not None else np.empty_like(buffer)
+        device.spare_buffer = None
+        device.clear_main()
+        task = asyncio.create_task(self.transcribe_audio(device, audio_data, buffer))
+        self._stt_tasks.add(task)
+        task.add_done_callback(self._stt_tasks.discard)
+
+    async def transcribe_audio(self, device: ESPDeviceState, audio_data: np.ndarray, buffer: np.ndarray):
+        """Transcribe one utterance, then hand its buffer back to the device as the spare"""
+        try:
+            # Samples are already float32 in [-1, 1], Whisper does its own log-mel scaling
+            if len(audio_data) > 0:
+                # Transcribe using Whisper off the event loop
+                loop = asyncio.get_running_loop()
+                transcribed_text = await loop.run_in_executor(self._stt_pool, self._transcribe_sync, audio_data)
+                if transcribed_text:
+                    logger.info(f"🗣️ {device.device_name}: {transcribed_text}")
                 
-                # Normalize audio
-                if len(audio_data) > 0:
-                    audio_data = audio_data / np.max(np.abs(audio_data))
-                    
-                    # Transcribe using Whisper
-                    result = self.whisper_model.transcribe(
-                        audio_data,
-                        language='en',
-                        fp16=torch.cuda.is_available(),
-                        temperature=0.0,
-                        without_timestamps=True,
-                        condition_on_previous_text=True,
-                        initial_prompt="Transcribing real-time speech:"
-                    )
-                    
-                    transcribed_text = result["text"].strip()
-                    if transcribed_text:
-                        logger.info(f"🗣️ {device.device_name}: {transcribed_text}")
-                    
-                    # Clear the main buffer after processing
-                    device.main_buffer = []
-                    
-            except Exception as e:
-                logger.error(f"Error transcribing audio from {device.device_name}: {e}")
+        except Exception as e:
+            logger.error(f"Error transcribing audio from {device.device_name}: {e}")
+        finally:
+            device.spare_buffer = buffer
 
     async def add_esp_device(self, host: str, encryption_key: str = None, port: int = 6053):
         """Add and connect to an ESP device"""
@@ -162,7 +227,7 @@ class ESP32UDPBridge:
             client.subscribe_voice_assistant(
                 handle_start=lambda *args: self.handle_pipeline_start(host, *args),
                 handle_stop=lambda *args: self.handle_pipeline_stop(host, *args),
-                handle_audio=lambda data: self.handle_audio(host, data)
+                handle_audio=lambda data: self._handle_api_audio(host, data)
             )
             
             logger.info(f"Successfully connected to {device_info.name} at {host}")
@@ -181,8 +246,10 @@ class ESP32UDPBridge:
             device.buffer_position = 0
             device.buffer_filled = False
             device.last_detection_time = 0
-            device.main_buffer = []
-            device.vad_buffer = b''
+            device.decimator.reset()
+            device.clear_main()
+            device.vad_buffer.clear()
+            device.error_logged = False
         return self.udp_port
 
     async def handle_pipeline_stop(self, host, server_side):
@@ -193,114 +260,136 @@ class ESP32UDPBridge:
             device.udp_port = None
             device.buffer_filled = False
             device.is_listening = False
-            device.main_buffer = []
-            device.vad_buffer = b''
+            device.clear_main()
+            device.vad_buffer.clear()
+
+    async def _handle_api_audio(self, host, data: bytes):
+        """Coroutine adapter, the API client expects an async audio handler"""
+        self.handle_audio(host, data)
 
-    async def handle_audio(self, host, data: bytes):
+    def handle_audio(self, host, data: bytes):
         """Process audio data with wake word detection and transcription"""
         device = self.esp_devices.get(host)
         if not device:
             return
 
         try:
-            # Convert and downsample from 32kHz to 16kHz
-            audio_data = np.frombuffer(data, dtype=np.int16)[::2]
+            # One clock read per packet, monotonic so wall-clock steps cannot stall detection
+            now = time.monotonic()
+            
+            # Convert and downsample from 32kHz to 16kHz through the anti-alias filter
+            # (the result is contiguous, so it packs with one memcpy)
+            audio_data = device.decimator.process(np.frombuffer(data, dtype=np.int16))
             
             # Process in fixed-size chunks
             chunk_size = len(audio_data)
             
             # If we're actively listening, process audio for transcription
             if device.is_listening:
-                # Convert audio to proper format for VAD
-                raw_audio = struct.pack("<%dh" % len(audio_data), *audio_data)
-                device.vad_buffer += raw_audio
-                
-                # Process VAD in 30ms frames
-                frames = list(self.frame_generator(device.vad_buffer, 16000, 30))
+                # Append the little-endian int16 bytes for VAD
+                device.vad_buffer.extend(audio_data.tobytes())
                 
-                # If we have enough frames for VAD
-                while len(frames) > 0:
-                    frame = frames.pop(0)
-                    if len(frame) == 960:  # 30ms at 16kHz
-                        if self.is_speech(frame):
-                            device.last_voice_activity = time.time()
-                            
-                        # Add normalized audio to main buffer
-                        float_data = np.frombuffer(frame, dtype=np.int16).astype(np.float32) / 32768.0
-                        device.main_buffer.extend(float_data)
+                # Process VAD in 30ms frames, one speech frame is enough to extend the utterance
+                frame_bytes = _VAD_FRAME_BYTES
+                consumed = len(device.vad_buffer) // frame_bytes * frame_bytes
+                if consumed:
+                    with memoryview(device.vad_buffer) as view:
+                        for cursor in range(0, consumed, frame_bytes):
+                            # webrtcvad only takes read-only bytes, and a copy keeps no export alive
+                            if self.is_speech(bytes(view[cursor:cursor + frame_bytes])):
+                                device.last_voice_activity = now
+                                break
                         
-                        # Remove processed frame from VAD buffer
-                        device.vad_buffer = device.vad_buffer[len(frame):]
+                        # Add all whole frames to the main buffer in one conversion pass, the
+                        # temporary int16 view is released as soon as append_main returns
+                        device.append_main(np.frombuffer(view[:consumed], dtype=np.int16))
+                    
+                    # Remove processed frames from VAD buffer in one shot
+                    del device.vad_buffer[:consumed]
                 
-                # Try to transcribe if we have enough audio
-                await self.transcribe_audio(device)
+                # Transcribe once there is enough speech followed by enough silence
+                if (device.main_len >= device.min_voice_length and
+                        now - device.last_voice_activity > device.voice_timeout):
+                    self.start_transcription(device)
                 
                 # Check for extended silence to stop listening
-                if time.time() - device.last_voice_activity > device.voice_timeout * 2:
+                if now - device.last_voice_activity > device.voice_timeout * 2:
                     device.is_listening = False
-                    device.main_buffer = []
-                    device.vad_buffer = b''
+                    device.clear_main()
+                    device.vad_buffer.clear()
                     logger.info(f"Stopped listening to {device.device_name} due to silence")
             
-            # Wake word detection logic
-            if device.buffer_position + chunk_size > device.buffer_size:
-                first_part = device.buffer_size - device.buffer_position
-                second_part = chunk_size - first_part
-                
-                device.audio_buffer[device.buffer_position:] = audio_data[:first_part]
-                device.audio_buffer[:second_part] = audio_data[first_part:]
-                device.buffer_position = second_part
-                
-                if (not device.is_listening and 
-                    time.time() - device.last_detection_time > device.detection_cooldown):
-                    if device.detector.detect(device.audio_buffer.copy()):
-                        logger.info(f"🎤 Wake word detected from {device.device_name}!")
-                        device.last_detection_time = time.time()
-                        device.is_listening = True
-                        device.main_buffer = []
-                        device.vad_buffer = b''
+            # Wake word detection streams only new audio, the detector keeps each
+            # device's feature history, so nothing is re-featurized
+            if device.is_listening:
+                device.buffer_position = 0
             else:
-                device.audio_buffer[
-                    device.buffer_position:device.buffer_position + chunk_size
-                ] = audio_data
-                device.buffer_position += chunk_size
+                pos = device.buffer_position
+                if pos + chunk_size > device.buffer_size:
+                    # Detection fell behind, keep the most recent audio
+                    keep = max(0, device.buffer_size - chunk_size)
+                    device.audio_buffer[:keep] = device.audio_buffer[pos - keep:pos]
+                    pos = keep
+                    audio_data = audio_data[-(device.buffer_size - keep):]
+                end = pos + len(audio_data)
+                device.audio_buffer[pos:end] = audio_data
+                device.buffer_position = end
                 
-                if (not device.is_listening and 
-                    device.buffer_position >= device.buffer_size * 0.75):
-                    if time.time() - device.last_detection_time > device.detection_cooldown:
-                        if device.detector.detect(device.audio_buffer[:device.buffer_position].copy()):
-                            logger.info(f"🎤 Wake word detected from {device.device_name}!")
-                            device.last_detection_time = time.time()
-                            device.is_listening = True
-                            device.main_buffer = []
-                            device.vad_buffer = b''
-            
-            # Reset buffer position if needed
-            if device.buffer_position >= device.buffer_size:
-                device.buffer_position = 0
+                if (end >= device.detect_chunk and device.infer_inflight is None and
+                        now - device.last_detection_time > device.detection_cooldown):
+                    self.start_detection(device, device.audio_buffer[:end].copy())
+                    device.buffer_position = 0
                         
         except Exception as e:
-            logger.error(f"Error handling audio data for {device.device_name}: {e}", exc_info=True)
+            # Errors here tend to repeat on every packet, format lazily and keep one traceback
+            if device.error_logged:
+                logger.error("Error handling audio data for %s: %s", device.device_name, e)
+            else:
+                device.error_logged = True
+                logger.exception("Error handling audio data for %s: %s", device.device_name, e)
+
+    def on_datagram(self, data: bytes, addr):
+        """Dispatch one received UDP packet to its device"""
+        if len(data) > 0:
+            host = addr[0]
+            if host in self.esp_devices:
+                self.handle_audio(host, data)
+
+    def start_detection(self, device: ESPDeviceState, window: np.ndarray):
+        """Run wake word detection in the background, skipping the window if one is already running"""
+        if device.infer_inflight is not None:
+            return
+        loop = asyncio.get_running_loop()
+        device.infer_inflight = loop.run_in_executor(
+            self._infer_pool, self.detector.detect, window, device.device_name
+        )
+        device.infer_inflight.add_done_callback(lambda future: self.on_detect(device, future))
+
+    def on_detect(self, device: ESPDeviceState, future: asyncio.Future):
+        """Start listening when a background detection finds the wake word"""
+        device.infer_inflight = None
+        try:
+            detected = future.result()
+        except Exception as e:
+            logger.error("Error in wake word detection for %s: %s", device.device_name, e)
+            return
+        if detected and not device.is_listening:
+            logger.info(f"🎤 Wake word detected from {device.device_name}!")
+            device.last_detection_time = time.monotonic()
+            device.is_listening = True
+            device.clear_main()
+            device.vad_buffer.clear()
 
     async def run(self):
         """Main run loop"""
         logger.info("Starting ESP32 UDP Bridge")
         
-        while self._running:
-            try:
-                loop = asyncio.get_event_loop()
-                data, addr = await loop.sock_recvfrom(self.udp_socket, self.buffer_size)
-                
-                if len(data) > 0:
-                    host = addr[0]
-                    if host in self.esp_devices:
-                        await self.handle_audio(host, data)
-                    
-            except (BlockingIOError, InterruptedError):
-                await asyncio.sleep(0.001)
-            except Exception as e:
-                logger.error(f"Error in main loop: {e}")
-                await asyncio.sleep(0.1)
+        # Packets are delivered by the transport, run until it closes
+        loop = asyncio.get_running_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(
+            lambda: _AudioProtocol(self), sock=self.udp_socket
+        )
+        await self.closed.wait()
 
     async def stop(self):
         """Stop the bridge"""
@@ -315,8 +404,14 @@ class ESP32UDPBridge:
                     logger.error(f"Error disconnecting {device.device_name}: {e}")
         
         # Close UDP socket
-        if self.udp_socket:
+        if self.transport:
+            self.transport.close()
+            self.transport = None
+        elif self.udp_socket:
             self.udp_socket.close()
+        self.closed.set()
+        self._infer_pool.shutdown(wait=False)
+        self._stt_pool.shutdown(wait=False)
 
 async def main():
     # Configuration
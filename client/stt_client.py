@@ -12,6 +12,7 @@ from wyoming.info import Info, Satellite
 import threading
 from typing import Optional
 from wake_word.detector import WakeWordDetector
+from utils.network import tune_tcp_client
 import logging
 from collections import deque
 import numpy as np
@@ -44,6 +45,9 @@ class WakeWordClient:
         self.sample_rate = 16000
         self.chunk_size = 320  # 20ms at 16kHz
         self.audio_buffer = deque(maxlen=50)  # 500ms buffer
+        self._audio_ready = asyncio.Event()  # Set from the audio thread when a chunk arrives
+        # Contiguous int16 scratch the buffered chunks are joined into
+        self._concat_buf = np.empty(self.chunk_size * self.audio_buffer.maxlen, dtype=np.int16)
         self.stream = None
         
         # State management
@@ -62,8 +66,11 @@ class WakeWordClient:
         self.max_reconnect_delay = 30.0
         self.connection_check_interval = 5.0
         
-        # Create asyncio queue for streaming
-        self.stream_queue = asyncio.Queue(maxsize=50)
+        # Streamed audio is coalesced into larger AudioChunk events
+        self.flush_bytes = 4096  # ~128 ms at 16kHz int16
+        self.flush_interval = 0.08  # Max seconds audio waits before being sent
+        self._send_buf = bytearray()
+        self._send_started = 0.0
 
     def audio_callback(self, indata, frames, time_info, status):
         """Minimal processing in audio callback"""
@@ -72,10 +79,10 @@ class WakeWordClient:
             return
             
         try:
-            # Convert to mono and add to buffer
-            audio_chunk = indata[:, 0]
-            audio_chunk = np.clip(audio_chunk, -1.0, 1.0)
-            self.audio_buffer.append(audio_chunk)
+            # Take a mono copy, sounddevice reuses indata after the callback returns
+            self.audio_buffer.append(indata[:, 0].copy())
+            if self.loop is not None:
+                self.loop.call_soon_threadsafe(self._audio_ready.set)
             
         except Exception as e:
             logger.error(f"Error in audio callback: {e}", exc_info=True)
@@ -84,24 +91,27 @@ class WakeWordClient:
         """Process audio chunks asynchronously"""
         while self.is_running:
             try:
+                # Sleep until the audio thread signals new chunks
+                await self._audio_ready.wait()
+                self._audio_ready.clear()
+                
                 if len(self.audio_buffer) > 0:
-                    # Process all available chunks
-                    audio_data = np.concatenate(list(self.audio_buffer))
-                    self.audio_buffer.clear()
-                    
-                    # Convert to int16 once
-                    audio_int16 = (audio_data * 32767).astype(np.int16)
+                    # Process all available chunks, popping so chunks the callback
+                    # appends meanwhile are kept for the next pass
+                    chunks = [self.audio_buffer.popleft() for _ in range(len(self.audio_buffer))]
+                    total = sum(len(chunk) for chunk in chunks)
+                    if total > len(self._concat_buf):
+                        self._concat_buf = np.empty(total, dtype=np.int16)
+                    audio_int16 = np.concatenate(chunks, out=self._concat_buf[:total])
                     
                     # Check for wake word
                     if not self.is_streaming and self.detector.detect(audio_int16):
                         logger.info("Wake word detected!")
                         await self.handle_wake_word(0.75)
                     
-                    # If streaming, add to stream queue
+                    # If streaming, send straight to the server
                     if self.is_streaming and self.is_connected:
-                        await self.stream_queue.put(audio_int16)
-                        
-                await asyncio.sleep(0.01)
+                        await self.send_audio(audio_int16)
                     
             except Exception as e:
                 logger.error(f"Error processing audio: {e}", exc_info=True)
@@ -160,6 +170,9 @@ class WakeWordClient:
             self.client = AsyncTcpClient(self.server_host, self.server_port)
             logger.info("Connecting...")
             await self.client.connect()
+            # Send small audio writes immediately, write_event drains so each
+            # event then waits until it reaches the kernel
+            tune_tcp_client(self.client, logger, write_high_water=0)
             logger.info("Connected")
             return True
         except Exception as e:
@@ -211,38 +224,34 @@ class WakeWordClient:
         ).event()
         await self.client.write_event(detection)
 
-    async def stream_audio_task(self):
-        """Dedicated task for streaming audio"""
-        while self.is_streaming and self.is_connected:
-            try:
-                try:
-                    audio_data = await asyncio.wait_for(
-                        self.stream_queue.get(),
-                        timeout=1.0
-                    )
-                except asyncio.TimeoutError:
-                    continue
-
-                if not self.is_connected:
-                    break
+    async def send_audio(self, audio_data: np.ndarray):
+        """Queue captured audio for the server, writing once enough has accumulated"""
+        if not self._send_buf:
+            self._send_started = time.monotonic()
+        self._send_buf.extend(memoryview(audio_data).cast('B'))
+        if (len(self._send_buf) >= self.flush_bytes or
+                time.monotonic() - self._send_started >= self.flush_interval):
+            await self.flush_audio()
 
-                audio_bytes = audio_data.tobytes()
-                await self.client.write_event(
-                    AudioChunk(
-                        audio=audio_bytes,
-                        rate=self.sample_rate,
-                        width=2,
-                        channels=1
-                    ).event()
-                )
-                
-                self.stream_queue.task_done()
-                
-            except Exception as e:
-                logger.error(f"Error streaming audio: {e}", exc_info=True)
-                self.is_connected = False
-                await self.stop_stream()
-                break
+    async def flush_audio(self):
+        """Write the accumulated audio as a single AudioChunk event"""
+        if not self._send_buf:
+            return
+        audio_bytes = bytes(self._send_buf)
+        self._send_buf.clear()
+        try:
+            await self.client.write_event(
+                AudioChunk(
+                    audio=audio_bytes,
+                    rate=self.sample_rate,
+                    width=2,
+                    channels=1
+                ).event()
+            )
+        except Exception as e:
+            logger.error(f"Error streaming audio: {e}", exc_info=True)
+            self.is_connected = False
+            await self.stop_stream()
 
     async def start_stream(self):
         """Start audio stream to server"""
@@ -252,22 +261,19 @@ class WakeWordClient:
                 width=2,
                 channels=1
             ).event())
+            self._send_buf.clear()
             self.is_streaming = True
-            # Start dedicated streaming task
-            asyncio.create_task(self.stream_audio_task())
             logger.info("Started audio stream")
 
     async def stop_stream(self):
         """Stop audio stream"""
         if self.is_streaming:
             self.is_streaming = False
-            # Clear stream queue
-            while not self.stream_queue.empty():
-                try:
-                    self.stream_queue.get_nowait()
-                    self.stream_queue.task_done()
-                except asyncio.QueueEmpty:
-                    break
+            
+            if self.is_connected:
+                # Send what is still buffered before the stop event
+                await self.flush_audio()
+            self._send_buf.clear()
             
             if self.is_connected:
                 try:
@@ -308,6 +314,7 @@ class WakeWordClient:
         self.stream = sd.InputStream(
             channels=1,
             samplerate=self.sample_rate,
+            dtype='int16',  # Capture int16 directly, no float round trip
             callback=self.audio_callback,
             blocksize=self.chunk_size,
             latency='low'
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Client modules import each other relative to the client directory (e.g. `from wake_word.detector import ...`)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
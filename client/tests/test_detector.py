@@ -0,0 +1,46 @@
+from collections import deque
+from types import SimpleNamespace
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("openwakeword")
+
+from wake_word.detector import WakeWordDetector
+
+
+class _FakeAudioFeatures:
+    """Stands in for openwakeword.utils.AudioFeatures, with the same in-place raw buffer handling"""
+
+    def __init__(self):
+        self.session = object()  # Loaded sessions are shared between the per-mic copies
+        self.raw_data_buffer = deque(maxlen=16000 * 10)
+
+    def reset(self):
+        self.raw_data_buffer.clear()
+
+    def _buffer_raw_data(self, x):
+        self.raw_data_buffer.extend(x.tolist())
+
+
+def _detector():
+    detector = WakeWordDetector.__new__(WakeWordDetector)
+    detector.oww = SimpleNamespace(preprocessor=_FakeAudioFeatures())
+    detector.preprocessors = {}
+    return detector
+
+
+def test_preprocessors_keep_separate_raw_buffers():
+    detector = _detector()
+    first = detector._get_preprocessor("mic-a")
+    first._buffer_raw_data(np.full(1280, 1, dtype=np.int16))
+
+    # Creating a second mic's preprocessor resets it, which must not clear the first one
+    second = detector._get_preprocessor("mic-b")
+    second._buffer_raw_data(np.full(1280, 2, dtype=np.int16))
+
+    assert first.raw_data_buffer is not second.raw_data_buffer
+    assert list(first.raw_data_buffer) == [1] * 1280
+    assert list(second.raw_data_buffer) == [2] * 1280
+    assert first.session is second.session
+    assert detector._get_preprocessor("mic-a") is first
@@ -0,0 +1,53 @@
+import os
+import socket
+
+import pytest
+
+import udp_batch
+from udp_batch import BatchReceiver
+
+_REPO = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def loopback():
+    rx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    rx.bind(("127.0.0.1", 0))
+    rx.setblocking(False)
+    tx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    tx.bind(("127.0.0.1", 0))
+    yield rx, tx
+    rx.close()
+    tx.close()
+
+
+@pytest.mark.parametrize("native", [True, False])
+def test_recv_returns_queued_datagrams_with_sender(loopback, native):
+    if native and udp_batch._recvmmsg is None:
+        pytest.skip("recvmmsg is not available on this platform")
+    rx, tx = loopback
+    receiver = BatchReceiver(rx, batch=4, size=64)
+    receiver._native = native
+
+    payloads = [bytes([i]) * (10 + i) for i in range(6)]
+    for payload in payloads:
+        tx.sendto(payload, rx.getsockname())
+
+    # Six datagrams in batches of four, then nothing is left
+    received = []
+    while len(received) < len(payloads):
+        batch = receiver.recv()
+        assert 0 < len(batch) <= 4
+        received.extend((bytes(view), addr) for view, addr in batch)
+    assert [data for data, _ in received] == payloads
+    assert all(addr == tx.getsockname() for _, addr in received)
+    with pytest.raises(BlockingIOError):
+        receiver.recv()
+
+
+def test_copies_are_identical():
+    with open(os.path.join(_REPO, "client", "udp_batch.py"), "rb") as f:
+        client_copy = f.read()
+    with open(os.path.join(_REPO, "services", "stt-server", "udp_batch.py"), "rb") as f:
+        service_copy = f.read()
+    assert client_copy == service_copy
@@ -0,0 +1,131 @@
+"""
+Batched UDP receive via recvmmsg(2).
+
+Kept in sync as two identical copies, client/udp_batch.py and services/stt-server/udp_batch.py.
+The stt-server service runs from its own directory with only that directory on sys.path,
+like its own wake_word/ and audio_processing/ copies, so it cannot import from client/.
+client/tests/test_udp_batch.py fails if the copies differ.
+"""
+import ctypes
+import ctypes.util
+import errno
+import socket
+import struct
+
+
+class _IOVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_IOVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _MsgHdr), ("msg_len", ctypes.c_uint)]
+
+
+def _load_recvmmsg():
+    """Return libc's recvmmsg, or None where it is not available (non-Linux)"""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        fn = libc.recvmmsg
+    except (OSError, AttributeError, TypeError):
+        return None
+    fn.argtypes = [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+    fn.restype = ctypes.c_int
+    return fn
+
+
+_recvmmsg = _load_recvmmsg()
+
+
+class BatchReceiver:
+    """
+    Reads up to `batch` queued datagrams from a non-blocking IPv4 UDP socket with one
+    recvmmsg() call, into preallocated slots that are reused on every call.
+    Falls back to a recvfrom_into loop where recvmmsg is not available.
+    """
+
+    _SOCKADDR_SIZE = 16  # sizeof(struct sockaddr_in)
+
+    def __init__(self, sock: socket.socket, batch: int = 32, size: int = 4096):
+        self.sock = sock
+        self.batch = batch
+        self.size = size
+        self._buf = bytearray(batch * size)
+        self._mv = memoryview(self._buf)
+        self._slots = [self._mv[i * size:(i + 1) * size] for i in range(batch)]
+        self._ips = {}  # Packed IPv4 address -> dotted string, devices are few
+
+        self._native = _recvmmsg is not None
+        if self._native:
+            buf_base = ctypes.addressof(ctypes.c_char.from_buffer(self._buf))
+            self._names = ctypes.create_string_buffer(batch * self._SOCKADDR_SIZE)
+            self._names_mv = memoryview(self._names).cast("B")
+            names_base = ctypes.addressof(self._names)
+            self._iov = (_IOVec * batch)()
+            self._msgs = (_MMsgHdr * batch)()
+            for i in range(batch):
+                self._iov[i].iov_base = buf_base + i * size
+                self._iov[i].iov_len = size
+                hdr = self._msgs[i].msg_hdr
+                hdr.msg_name = names_base + i * self._SOCKADDR_SIZE
+                hdr.msg_iov = ctypes.pointer(self._iov[i])
+                hdr.msg_iovlen = 1
+
+    def recv(self) -> list:
+        """
+        Read the datagrams queued right now.
+
+        Returns:
+            list: (memoryview, (ip, port)) pairs, the views are only valid until the next call
+
+        Raises:
+            BlockingIOError: Nothing was queued
+        """
+        if not self._native:
+            return self._recv_fallback()
+
+        msgs = self._msgs
+        for i in range(self.batch):
+            msgs[i].msg_hdr.msg_namelen = self._SOCKADDR_SIZE
+        n = _recvmmsg(self.sock.fileno(), msgs, self.batch, socket.MSG_DONTWAIT, None)
+        if n < 0:
+            err = ctypes.get_errno()
+            if err in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise BlockingIOError(err, "recvmmsg would block")
+            if err == errno.EINTR:
+                raise InterruptedError(err, "recvmmsg interrupted")
+            raise OSError(err, f"recvmmsg failed: {errno.errorcode.get(err, err)}")
+
+        names = self._names_mv
+        out = []
+        for i in range(n):
+            off = i * self._SOCKADDR_SIZE
+            port, packed = struct.unpack_from("!H4s", names, off + 2)
+            ip = self._ips.get(packed)
+            if ip is None:
+                ip = self._ips[packed] = socket.inet_ntoa(packed)
+            out.append((self._slots[i][:msgs[i].msg_len], (ip, port)))
+        return out
+
+    def _recv_fallback(self) -> list:
+        out = []
+        for slot in self._slots:
+            try:
+                nbytes, addr = self.sock.recvfrom_into(slot)
+            except (BlockingIOError, InterruptedError):
+                if out:
+                    break
+                raise
+            out.append((slot[:nbytes], addr))
+        return out
@@ -1,17 +1,20 @@
 import asyncio
+import concurrent.futures
 import logging
 import socket
 import time
 from datetime import datetime
-from collections import defaultdict, deque
+from collections import defaultdict
 from dataclasses import dataclass
 import numpy as np
+from numba import njit
 import wave
 import tempfile
 import os
 
+from udp_batch import BatchReceiver
 from wake_word.detector import WakeWordDetector
-from audio_processing.vad2 import VADProcessor
+from audio_processing.vad import VADProcessor
 from audio_processing.transcribe import WhisperProcessor
 logger = logging.getLogger(__name__)
 
@@ -26,9 +29,17 @@ class AudioDevice:
         # Audio buffers
         self.audio_buffer = bytearray()
         self.silence_counter = 0
-        self.vad_buffer = np.zeros(16000 * 2, dtype=np.float32)  # 2 seconds buffer at 16kHz
-        self.vad_cursor = 0
-        self.detection_buffer = deque(maxlen=50)  # 50 chunks for detection
+        # VAD ring buffer, ~2 seconds at 16kHz. The size is a power of two so the
+        # running write/read counters map to slots with a mask
+        self.vad_size = 32768
+        self.vad_buffer = np.zeros(self.vad_size, dtype=np.int16)
+        self.vad_write = 0  # Samples written since the ring was reset
+        self.vad_read = 0  # Samples already handed to VAD
+        # Wake word ring, ~1 second at 16kHz, written in place as packets arrive
+        self.detect_size = 16384
+        self.detect_ring = np.zeros(self.detect_size, dtype=np.int16)
+        self.detect_write = 0  # Samples written since the device was created
+        self.detect_read = 0  # Samples already handed to the detector
         
         # Device state
         self.last_activity = time.time()
@@ -38,35 +49,80 @@ class AudioDevice:
     def add_audio_data(self, data: bytes):
         """Add new audio data to buffers with proper synchronization"""
         try:
-            audio_chunk = np.frombuffer(data, dtype=np.int16).copy()
+            audio_chunk = np.frombuffer(data, dtype=np.int16)
             self.last_activity = time.time()
             
             if self.state == 'DETECTING':
-                self.detection_buffer.append(audio_clip(audio_chunk))
+                self.write_detect(audio_chunk)
             
             elif self.state == 'LISTENING':
                 self.audio_buffer.extend(data)
-                # Convert to float32 and downsample to 16kHz for VAD
-                audio_32k = audio_chunk.astype(np.float32) / 32767.0
-                audio_16k = audio_32k[::2]  # Downsample from 32kHz to 16kHz
-                
-                # Circular buffer implementation for VAD
-                remaining_space = len(self.vad_buffer) - self.vad_cursor
-                if len(audio_16k) > remaining_space:
-                    # Reset buffer if full
-                    self.vad_buffer = np.roll(self.vad_buffer, -self.vad_cursor)
-                    self.vad_cursor = 0
-                
-                end_pos = self.vad_cursor + len(audio_16k)
-                self.vad_buffer[self.vad_cursor:end_pos] = audio_16k
-                self.vad_cursor = end_pos
+                # Keep int16 for WebRTC VAD, decimated to 16kHz straight into the ring
+                self.write_vad(audio_chunk)
                 
         except Exception as e:
             logger.error(f"Error processing audio data: {e}")
 
-def audio_clip(audio_chunk: np.ndarray) -> np.ndarray:
-    """Clip audio values to int16 range efficiently"""
-    return np.clip(audio_chunk, -32768, 32767, out=audio_chunk).astype(np.int16)
+    def write_detect(self, pcm: np.ndarray):
+        """Append 32kHz int16 PCM to the detection ring, decimated to 16kHz"""
+        downsample2_into_ring(pcm, self.detect_ring, self.detect_write & (self.detect_size - 1))
+        self.detect_write += len(pcm) // 2
+
+    def detect_window(self, n: int) -> np.ndarray:
+        """The most recent n samples (at most the ring size) oldest first, a view unless they wrap"""
+        n = min(n, self.detect_size)
+        start = (self.detect_write - n) & (self.detect_size - 1)
+        end = start + n
+        if end <= self.detect_size:
+            return self.detect_ring[start:end]
+        return np.concatenate((self.detect_ring[start:], self.detect_ring[:end - self.detect_size]))
+
+    def detect_pending(self) -> int:
+        """Number of detection samples written since the last clear_detection"""
+        return self.detect_write - self.detect_read
+
+    def clear_detection(self):
+        """Mark all buffered detection audio as consumed"""
+        self.detect_read = self.detect_write
+
+    def take_audio(self):
+        """Hand over the recorded audio and start a fresh buffer, without copying it"""
+        frames = self.audio_buffer
+        self.audio_buffer = bytearray()
+        return frames
+
+    def write_vad(self, pcm: np.ndarray):
+        """Append 32kHz int16 PCM to the VAD ring at 16kHz, overwriting the oldest unread samples if VAD fell behind"""
+        n = len(pcm) // 2
+        if self.vad_write + n - self.vad_read > self.vad_size:
+            self.vad_read = self.vad_write + n - self.vad_size
+        downsample2_into_ring(pcm, self.vad_buffer, self.vad_write & (self.vad_size - 1))
+        self.vad_write += n
+
+    def read_vad(self, n: int) -> np.ndarray:
+        """Take the next n unread samples, a view into the ring unless they wrap"""
+        idx = self.vad_read & (self.vad_size - 1)
+        self.vad_read += n
+        end = idx + n
+        if end <= self.vad_size:
+            return self.vad_buffer[idx:end]
+        return np.concatenate((self.vad_buffer[idx:], self.vad_buffer[:end - self.vad_size]))
+
+    def vad_pending(self) -> int:
+        """Number of samples written but not yet read"""
+        return self.vad_write - self.vad_read
+
+    def reset_vad(self):
+        """Drop all buffered VAD audio"""
+        self.vad_write = 0
+        self.vad_read = 0
+
+@njit(cache=True)
+def downsample2_into_ring(src, ring, pos):
+    """Average each pair of 32kHz int16 samples into a power-of-two 16kHz ring from slot pos in one pass"""
+    mask = ring.size - 1
+    for i in range(src.size // 2):
+        ring[(pos + i) & mask] = (np.int32(src[2 * i]) + np.int32(src[2 * i + 1])) >> 1
 
 class VoiceAssistantUDPServer:
     def __init__(self, host: str = '0.0.0.0', port: int = 12345):
@@ -75,6 +131,19 @@ class VoiceAssistantUDPServer:
         self.socket = None
         self._running = False
         self.devices = {}
+        self._loop = None
+        
+        # Datagrams are drained with one recvmmsg() per readiness callback into reused slots
+        self.rx_batch = 32  # Max datagrams read per readiness callback
+        self._receiver = None
+        
+        # The process loop sleeps until packets arrive, waking periodically for timeouts
+        self._audio_ready = asyncio.Event()
+        self.idle_check_interval = 0.5
+        self.detect_chunk = 1280  # 80 ms at 16kHz, one openwakeword frame
+        
+        # Wake word inference runs on its own thread so the loop keeps draining packets
+        self._infer_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="wwd")
         
         # Add timeout for forced audio save
         self.max_listening_duration = 10  # Maximum seconds to wait before forcing audio save
@@ -83,7 +152,7 @@ class VoiceAssistantUDPServer:
         try:
             self.detector = WakeWordDetector(wake_word_models=["alexa"],model_paths=["../models/mirfa.onnx"])
             self.transcriber = WhisperProcessor()
-            self.vad = VADProcessor()
+            self.vad = VADProcessor(backend='webrtc')
             
         except Exception as e:
             logger.error(f"Failed to initialize processors: {e}")
@@ -97,41 +166,49 @@ class VoiceAssistantUDPServer:
             self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 65536)  # Increased buffer
             self.socket.bind((self.host, self.port))
             self.socket.setblocking(False)
+            self._receiver = BatchReceiver(self.socket, self.rx_batch, 4096)
             self._running = True
             
             logger.info(f"UDP Server started on {self.host}:{self.port}")
             
-            await asyncio.gather(
-                self.receive_loop(),
-                self.process_audio_loop()
+            self._loop = asyncio.get_running_loop()
+            
+            # Warm the detector up so the first real window does not pay for session setup
+            await self._loop.run_in_executor(
+                self._infer_pool, self.detector.detect, np.zeros(1280, dtype=np.int16), "warmup"
             )
+            
+            # Read the socket from the event loop's own readiness callback
+            self._loop.add_reader(self.socket.fileno(), self._drain)
+            
+            await self.process_audio_loop()
         except Exception as e:
             logger.error(f"Failed to start server: {e}")
             self.stop()
             raise
 
-    async def receive_loop(self):
-        """Asynchronous receive loop with proper error handling"""
-        loop = asyncio.get_event_loop()
+    def _drain(self):
+        """Read every queued datagram (up to rx_batch) when the socket becomes readable"""
+        try:
+            packets = self._receiver.recv()
+        except (BlockingIOError, InterruptedError):
+            return
+        except Exception as e:
+            logger.error(f"Receive error: {e}")
+            return
         
-        while self._running:
-            try:
-                def receive():
-                    return self.socket.recvfrom(1280)
-                    
-                data, addr = await loop.run_in_executor(None, receive)
-                ip = addr[0]
-                
-                if ip not in self.devices:
-                    self.devices[ip] = AudioDevice(ip)
-                
-                self.devices[ip].add_audio_data(data)
-                
-            except (BlockingIOError, InterruptedError):
-                await asyncio.sleep(0.001)
-            except Exception as e:
-                logger.error(f"Receive error: {e}")
-                await asyncio.sleep(0.1)  # Back off on error
+        devices = self.devices
+        for data, addr in packets:
+            ip = addr[0]
+            device = devices.get(ip)
+            if device is None:
+                device = devices[ip] = AudioDevice(ip)
+            
+            # add_audio_data copies what it keeps, so the slot can be reused
+            device.add_audio_data(data)
+        
+        if packets:
+            self._audio_ready.set()
 
     async def process_audio_loop(self):
         """Process audio with proper batch processing and error handling"""
@@ -139,7 +216,8 @@ class VoiceAssistantUDPServer:
             try:
                 current_time = time.time()
                 
-                # Process devices in batches
+                # Process devices in batches, wake word windows are collected for one inference call
+                ready = []
                 for ip, device in list(self.devices.items()):
                     # Force save audio if listening has gone on too long
                     if device.state == 'LISTENING' and device.listening:
@@ -156,27 +234,21 @@ class VoiceAssistantUDPServer:
                     
                     # Only do wake word detection if we're in DETECTING state
                     if device.state == 'DETECTING' and not device.listening:
-                        if len(device.detection_buffer) >= 25:  # At least 0.5s of audio
-                            audio_data = np.concatenate(list(device.detection_buffer))
-                            if self.detector.detect(audio_data[::2], ip):
-                                device.state = 'LISTENING'
-                                device.listening = True
-                                device.vad_cursor = 0
-                                device.listening_start_time = time.time()  # Track when listening started
-                                logger.info(f"Wake word detected from {ip}")
-                                device.detection_buffer.clear()  # Clear detection buffer when starting to listen
+                        pending = device.detect_pending()
+                        if pending >= self.detect_chunk:
+                            # The detector streams, so hand over only audio it has not seen yet, at
+                            # least one full frame so openwakeword does not repeat the last score.
+                            # Copied since packets keep landing in the ring during inference
+                            ready.append((ip, device, device.detect_window(pending).copy()))
+                            device.clear_detection()
                     
                     # VAD processing state
                     elif device.state == 'LISTENING':
                         # Process VAD in chunks
-                        while device.vad_cursor >= self.vad.chunk_size:
-                            vad_chunk = device.vad_buffer[:self.vad.chunk_size]
+                        while device.vad_pending() >= self.vad.chunk_size:
+                            vad_chunk = device.read_vad(self.vad.chunk_size)
                             speech_prob = self.vad.process_chunk(vad_chunk)
                             
-                            # Update buffer
-                            device.vad_buffer = np.roll(device.vad_buffer, -self.vad.chunk_size)
-                            device.vad_cursor -= self.vad.chunk_size
-                            
                             # Handle silence detection
                             if speech_prob == 0.0:
                                 device.silence_counter += 1
@@ -187,16 +259,40 @@ class VoiceAssistantUDPServer:
                                 device.silence_counter = 0
                             
                 
-                await asyncio.sleep(0.01)  # Reduced CPU usage
+                # Run every ready device through the detector in one executor call
+                if ready:
+                    results = await self._loop.run_in_executor(
+                        self._infer_pool, self._detect_batch, [(ip, audio) for ip, _, audio in ready]
+                    )
+                    for (ip, device, _), detected in zip(ready, results):
+                        if detected and device.state == 'DETECTING':
+                            device.state = 'LISTENING'
+                            device.listening = True
+                            device.reset_vad()
+                            device.listening_start_time = time.time()  # Track when listening started
+                            logger.info(f"Wake word detected from {ip}")
+                            device.clear_detection()  # Clear detection buffer when starting to listen
+                
+                # Wait for the next packets instead of polling
+                try:
+                    await asyncio.wait_for(self._audio_ready.wait(), timeout=self.idle_check_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._audio_ready.clear()
                 
             except Exception as e:
                 logger.error(f"Processing error: {e}")
                 await asyncio.sleep(0.1)  # Back off on error
 
+    def _detect_batch(self, batch):
+        """Run every collected window through the detector in one executor call"""
+        return [self.detector.detect(audio, ip) for ip, audio in batch]
+
     async def handle_speech_end(self, device):
         """Handle end of speech with proper file handling"""
         try:
-            audio_duration = len(device.audio_buffer) / (device.framerate * device.sample_width)
+            frames = device.take_audio()
+            audio_duration = len(frames) / (device.framerate * device.sample_width)
             
             if audio_duration >= self.vad.min_audio_length:
                 # logger.info("audio duration is fin")
@@ -208,7 +304,7 @@ class VoiceAssistantUDPServer:
                         wf.setnchannels(device.channels)
                         wf.setsampwidth(device.sample_width)
                         wf.setframerate(device.framerate)
-                        wf.writeframes(device.audio_buffer)
+                        wf.writeframes(frames)
                     transcript =  await self.transcriber.process_audio(temp_filename)
                 os.unlink(temp_filename)
 
@@ -232,17 +328,20 @@ class VoiceAssistantUDPServer:
         finally:
             # Reset device state
             device.audio_buffer.clear()
-            device.vad_cursor = 0
+            device.reset_vad()
             device.state = 'DETECTING'
             device.listening = False
             device.silence_counter = 0
-            device.detection_buffer.clear()
+            device.clear_detection()
 
     def stop(self):
         """Clean shutdown with proper resource cleanup"""
         self._running = False
+        self._infer_pool.shutdown(wait=False)
         if self.socket:
             try:
+                if self._loop is not None:
+                    self._loop.remove_reader(self.socket.fileno())
                 self.socket.close()
             except Exception as e:
                 logger.error(f"Error closing socket: {e}")
@@ -0,0 +1,29 @@
+import logging
+import socket
+from typing import Optional
+
+def tune_tcp_client(
+    client,
+    logger: logging.Logger,
+    sndbuf: Optional[int] = None,
+    keepalive: bool = False,
+    write_high_water: Optional[int] = None
+) -> bool:
+    """Set TCP_NODELAY and optional buffer settings on a connected wyoming AsyncTcpClient"""
+    writer = getattr(client, "_writer", None)
+    sock = writer.get_extra_info("socket") if writer is not None else None
+    if sock is None:
+        logger.warning("Could not tune connection: no socket available")
+        return False
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if sndbuf is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, sndbuf)
+        if keepalive:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        if write_high_water is not None:
+            writer.transport.set_write_buffer_limits(high=write_high_water)
+    except (OSError, AttributeError) as e:
+        logger.warning(f"Could not tune connection: {e}")
+        return False
+    return True
@@ -1,23 +1,58 @@
 import openwakeword
+import openwakeword.utils
 import numpy as np
 import logging
 
 
 import io
+import copy
 import time
 import os
 import requests
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Dict, Optional
-from collections import defaultdict
-
-import os
+from collections import defaultdict, deque
+from functools import partial
+import threading
 
 
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Wake word models are loaded once per process and shared by every detector,
+# keyed by model list and framework, each with the lock that serializes its use
+_MODELS: Dict[tuple, tuple] = {}
+_MODELS_LOCK = threading.Lock()
+
+# Intra-op threads for the melspectrogram/embedding sessions. Inference is serialized
+# per model and shares the process with Whisper, so more threads only oversubscribe
+_ORT_THREADS = 2
+
+
+def get_model(wakeword_models, inference_framework: str = "tflite"):
+    """
+    Get the shared openwakeword model for a set of wake word models, loading it on first use.
+    
+    Args:
+        wakeword_models (list): Model names or paths passed to openwakeword
+        inference_framework (str): "onnx" or "tflite"
+        
+    Returns:
+        tuple: (openwakeword.Model, threading.Lock) shared by all callers
+    """
+    key = (tuple(wakeword_models), inference_framework)
+    with _MODELS_LOCK:
+        entry = _MODELS.get(key)
+        if entry is None:
+            model = openwakeword.Model(
+                wakeword_models=list(wakeword_models),
+                inference_framework=inference_framework,
+                ncpu=min(_ORT_THREADS, os.cpu_count() or 1)
+            )
+            entry = _MODELS[key] = (model, threading.Lock())
+        return entry
+
 @dataclass
 class MicrophoneState:
     buffer: np.ndarray
@@ -60,6 +95,8 @@ class WakeWordDetector:
         try:
             # Check if model_path is provided for custom model
             if model_paths:
+                # Swap custom classifiers for their cached INT8 copies
+                model_paths = [self._quantize_model(path) for path in model_paths]
                 # Get the package directory
                 models = []
                 for path in model_paths:
@@ -76,28 +113,23 @@ class WakeWordDetector:
                 #     if not Path(path).exists():
                 #         raise FileNotFoundError(f"Custom model file not found at: {path}")
                 logger.info(f"Using custom model from: {model_paths}")
-                self.oww = openwakeword.Model(
-                    wakeword_models=model_paths,
-                    inference_framework="onnx"
-                )
+                self.inference_framework = "onnx"
+                self.oww, self._lock = get_model(model_paths, self.inference_framework)
 
                 self.wake_word_models = models;
             else:
                 # Try to initialize with default model, downloading if needed
                 try:
                     logger.info(f"Attempting to load model: {wake_word_models}")
-                    self.oww = openwakeword.Model(
-                        wakeword_models=wake_word_models
-                    )
+                    self.inference_framework = "tflite"
+                    self.oww, self._lock = get_model(wake_word_models, self.inference_framework)
                     self.wake_word_models = wake_word_models
                 except Exception as e:
                     logger.info("Model not found, attempting to download...")
                     if self.download_models():
                         logger.info("Retrying model initialization...")
-                        self.oww = openwakeword.Model(
-                            wakeword_models=wake_word_models,
-                            inference_framework="onnx"
-                        )
+                        self.inference_framework = "onnx"
+                        self.oww, self._lock = get_model(wake_word_models, self.inference_framework)
                     else:
                         raise RuntimeError("Failed to download and initialize model")
             
@@ -116,8 +148,43 @@ class WakeWordDetector:
         self.consecutive_threshold = 2
         self.max_buffer_size = int(16000 * 1.5)  # 1.5 seconds at 16kHz
         self.mic_states: Dict[str, MicrophoneState] = defaultdict(MicrophoneState.create_empty)
+        # Streaming feature extractors, one per microphone. Each keeps its own
+        # mel/embedding history so only newly arrived audio is featurized.
+        self.preprocessors: Dict[str, openwakeword.utils.AudioFeatures] = {}
+        # Score history, one per microphone. openwakeword repeats the last score when a
+        # call brings too little audio, so it must not come from another microphone.
+        self.prediction_buffers: Dict[str, defaultdict] = {}
 
 
+    @staticmethod
+    def _quantize_model(model_path: str) -> str:
+        """
+        Quantize a custom wake word ONNX model to INT8 weights, cached next to the original.
+        A statically calibrated <name>.qdq.onnx from tools/quantize_wake_word.py is preferred.
+        
+        Args:
+            model_path (str): Path to the FP32 ONNX model
+            
+        Returns:
+            str: Path to the INT8 model, or the original path if quantization fails
+        """
+        if not model_path.endswith(".onnx") or model_path.endswith((".int8.onnx", ".qdq.onnx")):
+            return model_path
+        static_path = model_path[:-len(".onnx")] + ".qdq.onnx"
+        if os.path.exists(static_path):
+            return static_path
+        quantized_path = model_path[:-len(".onnx")] + ".int8.onnx"
+        if os.path.exists(quantized_path):
+            return quantized_path
+        try:
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            logger.info(f"Quantizing wake word model {model_path} to INT8")
+            quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+            return quantized_path
+        except Exception as e:
+            logger.warning(f"INT8 quantization failed, using FP32 model: {e}")
+            return model_path
+
     def detect(self, audio_chunk: np.ndarray, mic_id: str) -> bool:
         """
         Detect wake word in audio chunk for a specific microphone.
@@ -129,6 +196,10 @@ class WakeWordDetector:
         Returns:
             bool: True if wake word detected, False otherwise
         """
+        with self._lock:
+            return self._detect(audio_chunk, mic_id)
+
+    def _detect(self, audio_chunk: np.ndarray, mic_id: str) -> bool:
         current_time = time.time()
         mic_state = self.mic_states[mic_id]
         
@@ -137,31 +208,30 @@ class WakeWordDetector:
             if not self._validate_audio(audio_chunk):
                 return False
 
-            # Update buffer for this specific microphone
-            mic_state.buffer = self._update_buffer(mic_state.buffer, audio_chunk)
+            # Feed only the new audio through this microphone's feature cache and score history
+            self.oww.preprocessor = self._get_preprocessor(mic_id)
+            self.oww.prediction_buffer = self._get_prediction_buffer(mic_id)
 
-            # Process if buffer is full
             consicutive_detected = False
-            if len(mic_state.buffer) == self.max_buffer_size:
-                prediction = self.oww.predict(mic_state.buffer)
-                for model in self.wake_word_models:
-                    confidence = prediction[model]
-                    if confidence > self.detection_threshold:
-                        mic_state.consecutive_detections += 1
-                        consicutive_detected = True
-                
-                if not consicutive_detected:
-                    mic_state.consecutive_detections = 0
-
-                # Check for wake word detection
-                if self._is_wake_word_detected(mic_state, current_time):
-                    logging.info(f"Wake word detected on mic {mic_id} with confidence: {confidence:.4f}")
-                    self._reset_mic_state(mic_state)
-                    return True
-
-                # Reset if too many consecutive detections
-                if mic_state.consecutive_detections > self.consecutive_threshold * 2:
-                    mic_state.consecutive_detections = 0
+            prediction = self.oww.predict(audio_chunk)
+            for model in self.wake_word_models:
+                confidence = prediction[model]
+                if confidence > self.detection_threshold:
+                    mic_state.consecutive_detections += 1
+                    consicutive_detected = True
+            
+            if not consicutive_detected:
+                mic_state.consecutive_detections = 0
+
+            # Check for wake word detection
+            if self._is_wake_word_detected(mic_state, current_time):
+                logging.info(f"Wake word detected on mic {mic_id} with confidence: {confidence:.4f}")
+                self._reset_mic_state(mic_state)
+                return True
+
+            # Reset if too many consecutive detections
+            if mic_state.consecutive_detections > self.consecutive_threshold * 2:
+                mic_state.consecutive_detections = 0
 
         except Exception as e:
             logging.error(f"Error in detect method for mic {mic_id}: {str(e)}")
@@ -175,18 +245,28 @@ class WakeWordDetector:
         audio_chunk = np.asarray(audio_chunk)
         return audio_chunk.size > 0 and np.isfinite(audio_chunk).all()
 
-    def _update_buffer(self, buffer: np.ndarray, audio_chunk: np.ndarray) -> np.ndarray:
-        """Update the audio buffer for a microphone."""
-        if len(buffer) == 0:
-            buffer = audio_chunk
-        else:
-            buffer = np.concatenate((buffer, audio_chunk))
-            
-        # Keep only the latest audio
-        if len(buffer) > self.max_buffer_size:
-            buffer = buffer[-self.max_buffer_size:]
-            
-        return buffer
+    def _get_preprocessor(self, mic_id: str) -> openwakeword.utils.AudioFeatures:
+        """Get the streaming feature extractor for a microphone, creating it on first use."""
+        preprocessor = self.preprocessors.get(mic_id)
+        if preprocessor is None:
+            # Share the loaded melspectrogram/embedding sessions, only the buffers are per mic.
+            # The copy is shallow, so the raw audio deque (cleared and extended in place by
+            # openwakeword) must be replaced before reset() or every mic would share it
+            shared = self.oww.preprocessor
+            preprocessor = copy.copy(shared)
+            preprocessor.raw_data_buffer = deque(maxlen=shared.raw_data_buffer.maxlen)
+            preprocessor.reset()
+            self.preprocessors[mic_id] = preprocessor
+        return preprocessor
+
+    def _get_prediction_buffer(self, mic_id: str) -> defaultdict:
+        """Get the score history for a microphone, creating it on first use."""
+        prediction_buffer = self.prediction_buffers.get(mic_id)
+        if prediction_buffer is None:
+            # Same layout openwakeword.Model uses for its own prediction_buffer
+            prediction_buffer = defaultdict(partial(deque, maxlen=30))
+            self.prediction_buffers[mic_id] = prediction_buffer
+        return prediction_buffer
 
     def _is_wake_word_detected(self, mic_state: MicrophoneState, current_time: float) -> bool:
         """Check if wake word is detected based on consecutive detections and cooldown."""
@@ -1,5 +1,6 @@
 import numpy as np
 import os
+import re
 from typing import Optional
 import traceback
 from typing import Optional
@@ -10,6 +11,7 @@ import time
 logger = logging.getLogger(__name__)
 import os
 import asyncio
+import functools
 
 class WhisperProcessor:
     def __init__(self, model_name: str = "medium"):
@@ -58,6 +60,13 @@ class WhisperProcessor:
                 }
         
         self.common_wake_words = ["alexa", "hey alexa", "ok google", "hey google", "siri", "hey siri", "mirfa"]
+        self._wake_pattern = re.compile(r'^(?:' + '|'.join(map(re.escape, self.common_wake_words)) + r')\s*', re.IGNORECASE)
+
+    @classmethod
+    async def create(cls, *args, **kwargs) -> "WhisperProcessor":
+        """Load the model in a worker thread so the event loop keeps running"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(cls, *args, **kwargs))
 
     async def process_audio(self, audio_filename: str) -> Optional[str]:
         """Transcribe audio file using Whisper model with optimized GPU handling"""
@@ -204,14 +213,7 @@ class WhisperProcessor:
                 logger.warning(f"Failed to clear CUDA memory during VAD processing: {e}")                
     def _remove_wake_words(self, text: str) -> str:
         """Remove wake words while preserving case and spacing"""
-        text_lower = text.lower()
-        
-        for wake_word in self.common_wake_words:
-            if text_lower.startswith(wake_word):
-                # Preserve original case by using the original text
-                return text[len(wake_word):].strip()
-        
-        return text
+        return self._wake_pattern.sub('', text, count=1).strip()
 
 
 async def main():
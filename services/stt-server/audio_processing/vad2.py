@@ -2,6 +2,7 @@ import numpy as np
 import torch
 import logging
 import os
+import asyncio
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +20,15 @@ class VADProcessor:
             os.makedirs(cache_dir, exist_ok=True)
             os.environ['TORCH_HOME'] = cache_dir
             
+            # VAD frames are tiny, intra/inter-op threading only adds overhead
+            torch.set_num_threads(1)
+            try:
+                torch.set_num_interop_threads(1)
+            except RuntimeError:
+                pass  # Already set once inter-op work has started
+            torch._C._jit_set_profiling_mode(False)
+            torch.jit.enable_onednn_fusion(True)
+
             logger.info(f"Loading Silero VAD model (CPU only)")
             
             # First load model without device specification
@@ -42,10 +52,19 @@ class VADProcessor:
             self.silence_threshold = 30
             self.chunk_size = 512
             self.vad_threshold = 0.4
+
+            # Reused input tensor, filled in place for every chunk
+            self._buf = torch.empty((1, self.chunk_size), dtype=torch.float32)
         except Exception as e:
             logger.error(f"Failed to initialize Silero VAD: {e}")
             raise
     
+    @classmethod
+    async def create(cls) -> "VADProcessor":
+        """Load the model in a worker thread so the event loop keeps running."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, cls)
+
     def process_chunk(self, audio_chunk: np.ndarray, binary_output: bool = True) -> float:
         """
         Process audio chunk and return speech probability or binary decision.
@@ -59,15 +78,16 @@ class VADProcessor:
         """
         try:
             # Ensure audio is the right shape
-            if len(audio_chunk.shape) == 1:
-                audio_chunk = audio_chunk.reshape(1, -1)
+            audio_chunk = audio_chunk.reshape(1, -1)
             
-            # Convert to tensor on CPU
-            audio_tensor = torch.tensor(audio_chunk, dtype=torch.float32)
-            audio_tensor = audio_tensor.to('cpu')  # Ensure it's on CPU
+            # Copy into the preallocated CPU tensor (from_numpy itself is zero-copy)
+            if audio_chunk.shape[1] == self.chunk_size:
+                audio_tensor = self._buf.copy_(torch.from_numpy(audio_chunk))
+            else:
+                audio_tensor = torch.from_numpy(audio_chunk.astype(np.float32))
             
             # Get speech probability
-            with torch.no_grad():
+            with torch.inference_mode():
                 speech_prob = self.vad_model(audio_tensor, self.sample_rate).item()
             
             # Convert to binary if requested
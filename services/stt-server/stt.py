@@ -64,7 +64,9 @@ class ClientEventHandler(AsyncEventHandler):
 
             elif event.type == 'audio-chunk' and self.device.is_streaming:
                 # Convert audio chunk to numpy array for VAD
-                audio_np = np.frombuffer(event.payload, dtype=np.int16).astype(np.float32) / 32767.0
+                # Payload is already 16kHz mono, so only scale (in place, no second copy)
+                audio_np = np.frombuffer(event.payload, dtype=np.int16).astype(np.float32)
+                audio_np *= 1.0 / 32768.0
                 
                 # Check audio duration
                 current_duration = time.time() - self.device.started_at
@@ -146,17 +148,19 @@ class ClientEventHandler(AsyncEventHandler):
                 audio_duration = time.time() - self.device.started_at
                 logger.info(f"Processing {len(self.device.audio_buffer)} bytes of audio ({audio_duration:.2f}s)...")
                 
-                # Create timestamp for filename
-                timestamp = time.strftime("%Y%m%d_%H%M%S")
-                audio_dir = "audio_files"
-                os.makedirs(audio_dir, exist_ok=True)
-                
-                # Save with proper WAV headers
-                wav_filename = os.path.join(audio_dir, f"audio_{self.device_id}_{timestamp}.wav")
-                self.save_wav_file(wav_filename, self.device.audio_buffer)
+                # Only keep a WAV copy on disk when debugging
+                if self.server.save_audio:
+                    timestamp = time.strftime("%Y%m%d_%H%M%S")
+                    audio_dir = "audio_files"
+                    os.makedirs(audio_dir, exist_ok=True)
+                    
+                    # Save with proper WAV headers
+                    wav_filename = os.path.join(audio_dir, f"audio_{self.device_id}_{timestamp}.wav")
+                    self.save_wav_file(wav_filename, self.device.audio_buffer)
                 
-                # Process audio using Whisper and handle command
-                await self.server.handle_transcription(self.device, wav_filename,self.device.id)
+                # Process audio using Whisper straight from memory and handle command
+                audio_pcm = np.frombuffer(bytes(self.device.audio_buffer), dtype=np.int16)
+                await self.server.handle_transcription(self.device, audio_pcm, self.device.id)
             else:
                 logger.info("No audio to process")
             
@@ -172,12 +176,14 @@ class ClientEventHandler(AsyncEventHandler):
 
 class STTServer:
     def __init__(self, host: str = "0.0.0.0", port: int = 10200,
-                 mqtt_api_host: str = "localhost"):
+                 mqtt_api_host: str = "localhost", whisper_model: str = "distil-small.en",
+                 save_audio: bool = False):
         self.host = host
         self.port = port
+        self.save_audio = save_audio  # Write captured commands to audio_files/ for debugging
         
         # Initialize audio processing
-        self.whisper = WhisperProcessor()  # Use base model for good balance
+        self.whisper = WhisperProcessor(model_name=whisper_model)
         self.command_processor = CommandProcessor()
         
         # Initialize device management
@@ -201,15 +207,15 @@ class STTServer:
     ) -> AsyncEventHandler:
         return ClientEventHandler(reader, writer, self)
 
-    async def handle_transcription(self, device: Device, wav_filename: str,mic_id:str):
+    async def handle_transcription(self, device: Device, audio_pcm: np.ndarray, mic_id: str):
         t1 =  int(time.time()*1000)
         try:
             
-            logger.info(f"processing start for {t1} {wav_filename}")
+            logger.info(f"processing start for {t1} {len(audio_pcm)} samples")
             
 
             # Use Whisper for transcription
-            text = self.whisper.process_audio(wav_filename)
+            text = await self.whisper.process_pcm(audio_pcm)
             if not text:
                 logger.info("No transcription received from Whisper")
                 return
@@ -252,7 +258,7 @@ class STTServer:
             logger.info(f"Error handling transcription: {e}")
             traceback.print_exc()
         t2 = int(time.time()*1000)
-        logger.info(f"processing complete for {wav_filename} {t2} {t2-t1} ")
+        logger.info(f"processing complete for {device.id} {t2} {t2-t1} ")
     async def handle_wake_word(self, device_id: str):
         device = self.device_manager.devices.get(device_id)
         if device and device.group:
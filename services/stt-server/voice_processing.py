@@ -1,52 +1,90 @@
 import numpy as np
 import os
+import re
+import functools
+import asyncio
+import concurrent.futures
 from typing import Optional
 import torch
 import traceback
-from typing import Optional
 # import whisper
 
 import logging
-from faster_whisper import WhisperModel  # Add this import
-import os
-import os
+from faster_whisper import WhisperModel, BatchedInferencePipeline
 logger = logging.getLogger(__name__)
 class WhisperProcessor:
-    def __init__(self, model_name: str = "distil-large-v3"):
+    def __init__(self, model_name: str = "distil-small.en"):
         """Initialize Whisper with specified model"""
         logger.info(f"Loading Whisper model: {model_name}")
         download_dir = os.path.join(os.path.dirname(__file__), "models")
         logger.info(f" downloading models ${model_name} in ${download_dir}")
-        num_threads = min(os.cpu_count(), 4)
+        num_threads = os.cpu_count()
 
-        self.model = WhisperModel(model_name,device="cpu",compute_type="int8",download_root=download_dir,cpu_threads=num_threads)
+        # "auto" lets CTranslate2 pick the fastest compute type the CPU supports
+        self.model = WhisperModel(model_name,device="cpu",compute_type="auto",download_root=download_dir,cpu_threads=num_threads,num_workers=2)
+        # Batched pipeline splits audio on Silero VAD segments and encodes them in parallel
+        self.batched = BatchedInferencePipeline(model=self.model)
+        self.batch_size = max(1, num_threads // 2)
+        # Beam search is only retried when greedy decoding is unsure
+        self.fallback_beam_size = 5
+        self.low_confidence_logprob = -1.0
+        # Single worker keeps transcriptions sequential and off the event loop
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=1)
         self.common_wake_words = ["alexa", "hey alexa", "ok google", "hey google", "siri", "hey siri"]
+        # One compiled prefix pattern covers every wake word in a single pass
+        self._wake_pattern = re.compile(r'^(?:' + '|'.join(map(re.escape, self.common_wake_words)) + r')\s*', re.IGNORECASE)
 
     def _remove_wake_words(self, text: str) -> str:
         """Remove common wake words from transcription"""
-        text_lower = text.lower()
-        
-        # Remove common wake words
-        for wake_word in self.common_wake_words:
-            if text_lower.startswith(wake_word):
-                return text[len(wake_word):].strip()
-        
-        return text
+        return self._wake_pattern.sub('', text, count=1).strip()
     
-    def process_audio(self, audio_filename: str) -> Optional[str]:
-        """Transcribe audio file using local Whisper model with enhanced processing"""
+    def _transcribe(self, audio, beam_size: int) -> list:
+        """Run the batched pipeline and materialize the segments"""
+        segments, info = self.batched.transcribe(
+            audio,
+            language="en",
+            beam_size=beam_size,
+            best_of=1,
+            temperature=0.0,
+            condition_on_previous_text=False,
+            batch_size=self.batch_size,
+            vad_filter=True,
+            without_timestamps=True,
+            initial_prompt="This is a smart home voice command."
+        )
+        return list(segments)
+
+    async def process_audio(self, audio_filename: str, beam_size: int = 1) -> Optional[str]:
+        """Transcribe audio file in the worker thread without blocking the event loop"""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._pool, self._transcribe_sync, audio_filename, beam_size
+        )
+
+    async def process_pcm(self, pcm_int16: np.ndarray, beam_size: int = 1) -> Optional[str]:
+        """Transcribe 16kHz int16 PCM already in memory, skipping the file decode"""
+        audio = pcm_int16.astype(np.float32)
+        audio *= 1.0 / 32768.0
+        return await asyncio.get_running_loop().run_in_executor(
+            self._pool, self._transcribe_sync, audio, beam_size
+        )
+
+    def _transcribe_sync(self, audio, beam_size: int = 1) -> Optional[str]:
+        """Transcribe an audio file or float32 samples using local Whisper model with enhanced processing"""
         try:
-            logger.info(f"Processing audio file with Whisper: {audio_filename}")
+            if isinstance(audio, str):
+                logger.info(f"Processing audio file with Whisper: {audio}")
+            else:
+                logger.info(f"Processing {len(audio)} samples with Whisper")
+            
+            # Greedy decoding is enough for short voice commands
+            segments = self._transcribe(audio, beam_size)
             
-            # Transcribe with faster-whisper
-            segments, info = self.model.transcribe(
-                audio_filename,
-                language="en",
-                beam_size=5,
-                best_of=5,
-                vad_filter=False,
-                initial_prompt="This is a smart home voice command."
-            )
+            # Retry with beam search when any segment is low confidence
+            if beam_size < self.fallback_beam_size and any(
+                segment.avg_logprob < self.low_confidence_logprob for segment in segments
+            ):
+                logger.info(f"Low confidence transcription, retrying with beam_size={self.fallback_beam_size}")
+                segments = self._transcribe(audio, self.fallback_beam_size)
             
             # Get text from segments
             transcription = " ".join([segment.text for segment in segments]).strip()
@@ -64,47 +102,63 @@ class WhisperProcessor:
             traceback.print_exc()
             return None
             
-    def _remove_wake_words(self, text: str) -> str:
-        """Remove common wake words from transcription"""
-        text_lower = text.lower()
-        
-        # Remove common wake words
-        for wake_word in self.common_wake_words:
-            if text_lower.startswith(wake_word):
-                return text[len(wake_word):].strip()
-        
-        return text
         
+@functools.lru_cache(maxsize=None)
+def _load_silero_vad(cache_dir: str):
+    """Load Silero VAD once per process, reusing the local torch.hub cache"""
+    logger.info(f"Downloading models silero_vad in {cache_dir}")
+    vad_model, _ = torch.hub.load(
+        repo_or_dir='snakers4/silero-vad',
+        model='silero_vad',
+        force_reload=False,
+        trust_repo=True
+    )
+    vad_model.eval()
+    try:
+        # Pre-fuse the JIT graph for CPU inference
+        vad_model = torch.jit.optimize_for_inference(
+            torch.jit.freeze(vad_model, preserved_attrs=["reset_states"])
+        )
+    except Exception as e:
+        logger.warning(f"Could not freeze Silero VAD model, using it as loaded: {e}")
+    return vad_model
+
 class VADProcessor:
     def __init__(self):
         cache_dir = os.path.join(os.path.dirname(__file__), "models", "torch_cache")
         # os.makedirs(cache_dir, exist_ok=True)
         os.environ['TORCH_HOME'] = cache_dir
-        logger.info(f"Downloading models silero_vad in {cache_dir}")
-        self.vad_model, _ = torch.hub.load(
-            repo_or_dir='snakers4/silero-vad',
-            model='silero_vad',
-            force_reload=True,
-            trust_repo=True
-        )
+        # VAD frames are tiny, intra/inter-op threading only adds overhead
+        torch.set_num_threads(1)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # Already set once inter-op work has started
+        torch._C._jit_set_profiling_mode(False)
+        torch.jit.enable_onednn_fusion(True)
+        self.vad_model = _load_silero_vad(cache_dir)
         self.sample_rate = 16000
         self.vad_threshold = 0.3
         self.silence_threshold = 15
         self.chunk_size = 512
         self.min_audio_length = 1.0  # Minimum audio length in seconds
         self.max_audio_length = 5.0  # Maximum audio length in seconds
+        # Reused input tensor, filled in place for every chunk
+        self._buf = torch.empty((1, self.chunk_size), dtype=torch.float32)
 
     def process_chunk(self, audio_chunk: np.ndarray) -> float:
         try:
             # Ensure audio is the right shape and type
-            if len(audio_chunk.shape) == 1:
-                audio_chunk = audio_chunk.reshape(1, -1)
+            audio_chunk = audio_chunk.reshape(1, -1)
             
-            # Convert to torch tensor
-            audio_tensor = torch.tensor(audio_chunk).float()
+            # Copy into the preallocated tensor (from_numpy itself is zero-copy)
+            if audio_chunk.shape[1] == self.chunk_size:
+                audio_tensor = self._buf.copy_(torch.from_numpy(audio_chunk))
+            else:
+                audio_tensor = torch.from_numpy(audio_chunk.astype(np.float32))
             
             # Get speech probability
-            with torch.no_grad():
+            with torch.inference_mode():
                 speech_prob = self.vad_model(audio_tensor, self.sample_rate).item()
             
             return speech_prob
@@ -0,0 +1,97 @@
+"""
+One-time static INT8 quantization of a custom wake word classifier (e.g. mirfa.onnx).
+
+The classifier consumes openwakeword embeddings, so calibration windows are built by
+running recorded 16kHz mono int16 WAV clips through openwakeword's feature models.
+The output is written next to the model as <name>.qdq.onnx, which WakeWordDetector
+loads in preference to the FP32 model.
+
+Usage:
+    python quantize_wake_word.py ../models/mirfa.onnx recordings/
+"""
+import argparse
+import glob
+import logging
+import os
+import wave
+
+import numpy as np
+import onnxruntime as ort
+import openwakeword.utils
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    QuantFormat,
+    QuantType,
+    quantize_static,
+)
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCalibrationReader(CalibrationDataReader):
+    """Feeds classifier-shaped embedding windows computed from WAV clips"""
+
+    def __init__(self, model_path: str, wav_dir: str, max_windows: int = 200):
+        session = ort.InferenceSession(model_path, providers=['CPUExecutionProvider'])
+        model_input = session.get_inputs()[0]
+        self.input_name = model_input.name
+        n_frames = model_input.shape[1]
+
+        features = openwakeword.utils.AudioFeatures(inference_framework="onnx")
+        windows = []
+        for path in sorted(glob.glob(os.path.join(wav_dir, "*.wav"))):
+            clip = self._read_wav(path)
+            if clip is None:
+                continue
+            embeddings = features.embed_clips(clip[None, :], batch_size=1)[0]
+            for start in range(0, len(embeddings) - n_frames + 1, n_frames):
+                windows.append(embeddings[start:start + n_frames][None].astype(np.float32))
+                if len(windows) >= max_windows:
+                    break
+            if len(windows) >= max_windows:
+                break
+
+        if not windows:
+            raise RuntimeError(f"No usable 16kHz mono WAV clips found in {wav_dir}")
+        logger.info(f"Calibrating with {len(windows)} windows")
+        self._windows = iter(windows)
+
+    @staticmethod
+    def _read_wav(path: str):
+        with wave.open(path, 'rb') as wav_file:
+            if wav_file.getframerate() != 16000 or wav_file.getnchannels() != 1 or wav_file.getsampwidth() != 2:
+                logger.warning(f"Skipping {path}, expected 16kHz mono 16-bit audio")
+                return None
+            return np.frombuffer(wav_file.readframes(wav_file.getnframes()), dtype=np.int16)
+
+    def get_next(self):
+        window = next(self._windows, None)
+        return None if window is None else {self.input_name: window}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("model", help="FP32 wake word classifier ONNX model")
+    parser.add_argument("wav_dir", help="Directory of 16kHz mono int16 WAV clips for calibration")
+    parser.add_argument("--windows", type=int, default=200, help="Number of calibration windows")
+    args = parser.parse_args()
+
+    output = args.model[:-len(".onnx")] + ".qdq.onnx"
+    reader = EmbeddingCalibrationReader(args.model, args.wav_dir, args.windows)
+    quantize_static(
+        args.model,
+        output,
+        reader,
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QInt8,
+        weight_type=QuantType.QInt8,
+        op_types_to_quantize=["MatMul", "Conv", "Gemm"],
+        extra_options={"ActivationSymmetric": True, "WeightSymmetric": True},
+    )
+    logger.info(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()